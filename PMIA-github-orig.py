@@ -5,198 +5,515 @@
 
 from __future__ import division
 import networkx as nx
-import math, time
+import os, math, time, heapq
 from copy import deepcopy
-from runIAC import avgIAC
 import multiprocessing, json
-from runIAC import avgIAC, runIAC
-
-def updateAP(ap, S, PMIIAv, PMIIA_MIPv, Ep):
+from array import array
+from csrgraph import CSRGraph
+from arborescence import Arborescence
+from nameindex import NameIndex
+from reorder import reorderGraph
+from instrument import NO_PROFILE, Profile
+from checkpoint import Checkpoint, stateMeta, saveBase, saveIteration, restore
+from forestindex import indexKey, indexPath, writeIndex, openIndex
+from arena import TreeArena, DEFAULT_BUDGET
+from spread import SpreadEstimator
+
+def updateAP(ap, S, v, PMIIAv):
     ''' Assumption: PMIIAv is a directed tree, which is a subgraph of general G.
-    PMIIA_MIPv -- dictionary of MIP from nodes in PMIIA
-    PMIIAv is rooted at v.
+    PMIIAv is rooted at v and stores its nodes parents first, so ap is filled
+    in one sweep over that order reversed (from leaves to root).
+    ap[v] becomes an array aligned with PMIIAv.nodes.
     '''
-    # going from leaves to root
-    sorted_MIPs = sorted(PMIIA_MIPv.iteritems(), key = lambda (_, MIP): len(MIP), reverse = True)
-    for u, _ in sorted_MIPs:
-        if u in S:
-            ap[(u, PMIIAv)] = 1
-        elif not PMIIAv.in_edges([u]):
-            ap[(u, PMIIAv)] = 0
-        else:
-            in_edges = PMIIAv.in_edges([u], data=True)
-            prod = 1
-            for w, _, edata in in_edges:
-                # p = (1 - (1 - Ep[(w, u)])**edata["weight"])
-                p = Ep[(w,u)]
-                prod *= 1 - ap[(w, PMIIAv)]*p
-            ap[(u, PMIIAv)] = 1 - prod
-
-def updateAlpha(alpha, v, S, PMIIAv, PMIIA_MIPv, Ep, ap):
-    # going from root to leaves
-    sorted_MIPs =  sorted(PMIIA_MIPv.iteritems(), key = lambda (_, MIP): len(MIP))
-    for u, mip in sorted_MIPs:
-        if u == v:
-            alpha[(PMIIAv, u)] = 1
-        else:
-            out_edges = PMIIAv.out_edges([u])
-            assert len(out_edges) == 1, "node u=%s must have exactly one neighbor, got %s instead" %(u, len(out_edges))
-            w = out_edges[0][1]
-            if w in S:
-                alpha[(PMIIAv, u)] = 0
-            else:
-                in_edges = PMIIAv.in_edges([w], data=True)
-                prod = 1
-                for up, _, edata in in_edges:
-                    if up != u:
-                        # pp_upw = 1 - (1 - Ep[(up, w)])**edata["weight"]
-                        pp_upw = Ep[(up, w)]
-                        prod *= (1 - ap[(up, PMIIAv)]*pp_upw)
-                # alpha[(PMIIAv, u)] = alpha[(PMIIAv, w)]*(1 - (1 - Ep[(u,w)])**PMIIAv[u][w]["weight"])*prod
-                alpha[(PMIIAv, u)] = alpha[(PMIIAv, w)]*(Ep[(u,w)])*prod
-
-def computePMIOA(G, u, theta, S, Ep):
+    ap[v] = PMIIAv.compute_ap(S)
+
+def updateAlpha(alpha, v, S, PMIIAv, ap):
+    ''' alpha[v] becomes an array aligned with PMIIAv.nodes, filled in one
+    sweep from root to leaves.
+    '''
+    alpha[v] = PMIIAv.compute_alpha(S, ap[v])
+
+def buildGraph(G, Ep, theta):
+    ''' Pack G into a CSRGraph for the PMIA searches. Node ids are the
+    positions of G's nodes in sorted order, so comparing ids compares labels.
+    Each edge carries two columns aligned with the edge array: Ep, and
+    -log(Ep), the edge length the Dijkstra searches add up; the log is taken
+    once per edge here instead of once per tree that reaches the edge.
+    Edges with Ep <= theta are dropped: a path through one has probability
+    below theta, so no PMIIA or PMIOA can contain it.
+    Returns the graph and the list of node labels indexed by id.
+    '''
+    index = NameIndex(sorted(G))
+    graph = CSRGraph('dd')
+    graph.add_vertices(len(index))
+    for u, v in G.edges():
+        p = Ep[(u, v)]
+        if p <= theta:
+            continue
+        graph.add_edge(index.id(u), index.id(v), p, -math.log(p))
+    return graph, index.names()
+
+def isolatedNodes(graph):
+    ''' Ids of the nodes of graph with no edges left in either direction. '''
+    return [v for v in range(graph.vcount())
+            if not graph.in_neighbors(v) and not graph.out_neighbors(v)]
+
+def computePMIOA(graph, u, max_dist, S, rank, profile=NO_PROFILE):
     '''
-     Compute PMIOA -- subgraph of G that's rooted at u.
-     Uses Dijkstra's algorithm until length of path doesn't exceed -log(theta)
-     or no more nodes can be reached.
+     Compute PMIOA -- subgraph of graph that's rooted at u.
+     Uses Dijkstra's algorithm until length of path doesn't exceed
+     max_dist = -log(theta) or no more nodes can be reached.
+     Ties are broken by rank, the position of each node's label in sorted
+     order, so the tree doesn't depend on how the nodes are numbered.
     '''
-    # initialize PMIOA
-    PMIOA = nx.DiGraph()
-    PMIOA.add_node(u)
-    PMIOA_MIP = {u: [u]} # MIP(u,v) for v in PMIOA
+    Ep, length = graph.column(0), graph.column(1)
+    # initialize PMIOA as flat lists: nodes in the order they are reached,
+    # index of each node's parent and Ep of the edge from it
+    position = {u: 0}
+    nodes, parents, weights = [u], [-1], [0]
 
-    crossing_edges = set([out_edge for out_edge in G.out_edges([u]) if out_edge[1] not in S + [u]])
-    edge_weights = dict()
     dist = {u: 0} # shortest paths from the root u
+    # frontier[w] = (dist, rank[x], rank[w], x, w, e) for the best crossing edge
+    # e = (x, w) into w;
+    # the heap holds these keys plus superseded ones, which are skipped on pop
+    frontier = dict()
+    heap = []
+
+    def add_crossing_edges(x):
+        start, end = graph.out_range(x)
+        for e, w in zip(range(start, end), graph.out_neighbors(x)):
+            if w in position or w in S:
+                continue
+            key = (dist[x] + length[e], rank[x], rank[w], x, w, e)
+            if key[0] >= max_dist:
+                continue # a graph file may keep edges longer than the cutoff
+            if w not in frontier or key < frontier[w]:
+                frontier[w] = key
+                heapq.heappush(heap, key)
+
+    add_crossing_edges(u)
 
     # grow PMIOA
-    while crossing_edges:
-        # Dijkstra's greedy criteria
-        min_dist = float("Inf")
-        sorted_crossing_edges = sorted(crossing_edges) # to break ties consistently
-        for edge in sorted_crossing_edges:
-            if edge not in edge_weights:
-                # edge_weights[edge] = -math.log(1 - (1 - Ep[edge])**G[edge[0]][edge[1]]["weight"])
-                edge_weights[edge] = -math.log(Ep[edge])
-            edge_weight = edge_weights[edge]
-            if dist[edge[0]] + edge_weight < min_dist:
-                min_dist = dist[edge[0]] + edge_weight
-                min_edge = edge
+    pops = 0
+    while heap:
+        # Dijkstra's greedy criteria; ties are broken by the ranks of (x, w)
+        key = heapq.heappop(heap)
+        pops += 1
+        min_dist, _, _, x, w, e = key
+        if frontier.get(w) != key:
+            continue
         # check stopping criteria
-        if min_dist < -math.log(theta):
-            dist[min_edge[1]] = min_dist
-            # PMIOA.add_edge(min_edge[0], min_edge[1], {"weight": G[min_edge[0]][min_edge[1]]["weight"]})
-            PMIOA.add_edge(min_edge[0], min_edge[1])
-            PMIOA_MIP[min_edge[1]] = PMIOA_MIP[min_edge[0]] + [min_edge[1]]
-            # update crossing edges
-            crossing_edges.difference_update(G.in_edges(min_edge[1]))
-            crossing_edges.update([out_edge for out_edge in G.out_edges(min_edge[1])
-                                   if (out_edge[1] not in PMIOA) and (out_edge[1] not in S)])
+        if min_dist < max_dist:
+            del frontier[w]
+            dist[w] = min_dist
+            position[w] = len(nodes)
+            nodes.append(w)
+            parents.append(position[x])
+            weights.append(Ep[e])
+            add_crossing_edges(w)
         else:
             break
-    return PMIOA, PMIOA_MIP
+    profile.count("pmioa_heap_pops", pops)
+    profile.count("pmioa_heap_pushes", pops + len(heap))
+    profile.count("pmioa_extracted", len(nodes) - 1)
+    return Arborescence(nodes, parents, weights)
 
-def updateIS(IS, S, u, PMIOA, PMIIA):
+def updateIS(IS, treeSeeds, u, PMIOA, PMIIA):
     for v in PMIOA[u]:
-        for si in S:
+        i = PMIIA[v].index(u)
+        if i < 0:
+            continue
+        # only seeds inside PMIIA[v] can have u on their MIP to v
+        for si, j in treeSeeds[v].iteritems():
             # if seed node is effective and it's blocked by u
-            # then it becomes ineffective
-            if (si in PMIIA[v]) and (si not in IS[v]) and (u in PMIIA[v][si]):
-                    IS[v].append(si)
-
-def computePMIIA(G, ISv, v, theta, S, Ep):
-
-    # initialize PMIIA
-    PMIIA = nx.DiGraph()
-    PMIIA.add_node(v)
-    PMIIA_MIP = {v: [v]} # MIP(u,v) for u in PMIIA
-
-    crossing_edges = set([in_edge for in_edge in G.in_edges([v]) if in_edge[0] not in ISv + [v]])
-    edge_weights = dict()
-    dist = {v: 0} # shortest paths from the root u
+            # then it becomes ineffective; u blocks si when it is on
+            # MIP(si, v), i.e. u is an ancestor of si in PMIIA[v]
+            if (si not in IS[v]) and PMIIA[v].is_ancestor(i, j):
+                IS[v].add(si)
+
+def computePMIIA(graph, ISv, v, max_dist, S, rank, profile=NO_PROFILE):
+    Ep, length = graph.column(0), graph.column(1)
+    # initialize PMIIA as flat lists: nodes in the order they are reached,
+    # index of each node's parent and Ep of the edge to it
+    position = {v: 0}
+    nodes, parents, weights = [v], [-1], [0]
+    seeds = dict() # seed to its index in the tree
+
+    dist = {v: 0} # shortest paths from the root v
+    # frontier[w] = (dist, rank[w], rank[x], w, x, e) for the best crossing edge
+    # e = (w, x) out of w;
+    # the heap holds these keys plus superseded ones, which are skipped on pop
+    frontier = dict()
+    heap = []
+
+    def add_crossing_edges(x):
+        for w, e in zip(graph.in_neighbors(x), graph.in_edges(x)):
+            if w in position or w in ISv:
+                continue
+            key = (dist[x] + length[e], rank[w], rank[x], w, x, e)
+            if key[0] >= max_dist:
+                continue # a graph file may keep edges longer than the cutoff
+            if w not in frontier or key < frontier[w]:
+                frontier[w] = key
+                heapq.heappush(heap, key)
+
+    add_crossing_edges(v)
 
     # grow PMIIA
-    while crossing_edges:
-        # Dijkstra's greedy criteria
-        min_dist = float("Inf")
-        sorted_crossing_edges = sorted(crossing_edges) # to break ties consistently
-        for edge in sorted_crossing_edges:
-            if edge not in edge_weights:
-                # edge_weights[edge] = -math.log(1 - (1 - Ep[edge])**G[edge[0]][edge[1]]["weight"])
-                edge_weights[edge] = -math.log(Ep[edge])
-            edge_weight = edge_weights[edge]
-            if dist[edge[1]] + edge_weight < min_dist:
-                min_dist = dist[edge[1]] + edge_weight
-                min_edge = edge
+    pops = 0
+    while heap:
+        # Dijkstra's greedy criteria; ties are broken by the ranks of (w, x)
+        key = heapq.heappop(heap)
+        pops += 1
+        min_dist, _, _, w, x, e = key
+        if frontier.get(w) != key:
+            continue
         # check stopping criteria
-        # print min_edge, ':', min_dist, '-->', -math.log(theta)
-        if min_dist < -math.log(theta):
-            dist[min_edge[0]] = min_dist
-            # PMIIA.add_edge(min_edge[0], min_edge[1], {"weight": G[min_edge[0]][min_edge[1]]["weight"]})
-            PMIIA.add_edge(min_edge[0], min_edge[1])
-            PMIIA_MIP[min_edge[0]] = PMIIA_MIP[min_edge[1]] + [min_edge[0]]
-            # update crossing edges
-            crossing_edges.difference_update(G.out_edges(min_edge[0]))
-            if min_edge[0] not in S:
-                crossing_edges.update([in_edge for in_edge in G.in_edges(min_edge[0])
-                                       if (in_edge[0] not in PMIIA) and (in_edge[0] not in ISv)])
+        if min_dist < max_dist:
+            del frontier[w]
+            dist[w] = min_dist
+            position[w] = len(nodes)
+            nodes.append(w)
+            parents.append(position[x])
+            weights.append(Ep[e])
+            # seeds block influence, so they are never expanded
+            if w in S:
+                seeds[w] = position[w]
+            else:
+                add_crossing_edges(w)
         else:
             break
-    return PMIIA, PMIIA_MIP
+    profile.count("pmiia_heap_pops", pops)
+    profile.count("pmiia_heap_pushes", pops + len(heap))
+    profile.count("pmiia_extracted", len(nodes) - 1)
+    profile.observe("pmiia_size", len(nodes))
+    return Arborescence(nodes, parents, weights), seeds
+
+# graph, max_dist and rank for the initialization workers; set before the pool forks
+# so the workers inherit them instead of receiving a pickled copy per task
+_shared = dict()
+
+def _computeInitialPMIIA(v):
+    ''' Pool worker: build PMIIA[v] for the empty seed set and return it as the
+    tree's flat arrays (v, nodes, parent index, Ep to parent, alpha).
+    '''
+    graph, max_dist, rank = _shared["graph"], _shared["max_dist"], _shared["rank"]
+    S = set()
+    PMIIAv, _ = computePMIIA(graph, set(), v, max_dist, S, rank)
+    ap = {v: array('d', [0])*len(PMIIAv)}
+    alpha = dict()
+    updateAlpha(alpha, v, S, PMIIAv, ap)
+    return v, PMIIAv.nodes, PMIIAv.parent, PMIIAv.weight, alpha[v]
 
-def PMIA(G, k, theta, Ep):
+# rebuilds per iteration below which the pool isn't worth its round trip
+PARALLEL_REBUILD = 32
+
+def _rebuildPMIIA(task):
+    ''' Pool worker: rebuild PMIIA[v] after a new seed for each (v, IS[v]) of
+    a batch, with S the seed set including the new seed. Returns per tree
+    (v, nodes, parent index, Ep to parent, {seed: index}, ap, alpha) and
+    the IncInf increments [(w, alpha*(1 - ap)), ...] of its non-seed nodes.
+    '''
+    graph, max_dist, rank = _shared["graph"], _shared["max_dist"], _shared["rank"]
+    S, batch = task
+    results = []
+    for v, ISv in batch:
+        PMIIAv, seeds = computePMIIA(graph, ISv, v, max_dist, S, rank)
+        ap, alpha = dict(), dict()
+        updateAP(ap, S, v, PMIIAv)
+        updateAlpha(alpha, v, S, PMIIAv, ap)
+        increments = [(w, alpha[v][i]*(1 - ap[v][i])) for i, w in enumerate(PMIIAv) if w not in S]
+        results.append((v, PMIIAv.nodes, PMIIAv.parent, PMIIAv.weight, seeds, ap[v], alpha[v], increments))
+    return results
+
+def iterPMIA(G, k, theta, Ep, processes=1, drop_isolated=False, order=None, profile=NO_PROFILE,
+             checkpoint=None, resume=False, index=None, arena=None, arena_budget=DEFAULT_BUDGET):
+    ''' Run PMIA up to k seeds and yield (u, elapsed) as soon as each seed u
+    is chosen. PMIA is greedy, so the first i seeds yielded are exactly
+    PMIA(G, i, theta, Ep); elapsed is the time the run has spent since it
+    started, not counting the time the caller takes between two seeds (e.g.
+    estimating the spread of each prefix).
+    With processes other than 1 a multiprocessing pool (None uses every
+    core) builds the initial PMIIA forest and, in iterations whose seed
+    reaches at least PARALLEL_REBUILD trees, rebuilds those trees; the
+    seeds are the same as with the serial loops.
+    Edges with Ep <= theta are pruned before the forest is built. With
+    drop_isolated, nodes left without edges get no PMIIA either: each one
+    only ever influences itself, so it stays a candidate with IncInf 1 and
+    the seeds are the same as without the option.
+    order ("bfs", "rcm" or "degree") renumbers the nodes for locality first,
+    see reorder.py; the seeds are the same for every order.
+    profile, an instrument.Profile, collects phase times and counters.
+    checkpoint, resume, index, arena and arena_budget are passed to
+    iterPMIAGraph().
+    '''
+    with profile.phase("pack"):
+        graph, labels = buildGraph(G, Ep, theta)
+    m = G.number_of_edges()
+    profile.count("edges", m)
+    profile.count("edges_pruned", m - graph.ecount())
+    print 'Pruned %s of %s edges with Ep <= theta (%.1f%%), %s edges left' %(
+        m - graph.ecount(), m, 100*(m - graph.ecount())/max(m, 1), graph.ecount())
+    if order is not None:
+        with profile.phase("reorder"):
+            graph, labels = reorderGraph(graph, labels, order)
+    return iterPMIAGraph(graph, labels, k, theta, processes, drop_isolated, profile, checkpoint, resume, index,
+                         arena, arena_budget)
+
+def iterPMIAGraph(graph, labels, k, theta, processes=1, drop_isolated=False, profile=NO_PROFILE,
+                  checkpoint=None, resume=False, index=None, arena=None, arena_budget=DEFAULT_BUDGET):
+    ''' iterPMIA on a graph already packed by buildGraph() or mapped by
+    graphfile.loadGraph(): nodes are ids 0..n-1 and the edge columns are Ep
+    and -log(Ep). Yields (labels[u], elapsed) for each seed id u.
+    Phases recorded in profile: init (with pmiia_build and sweep per tree
+    when serial), then per iteration pmioa, decrement, update_is,
+    pmiia_rebuild, sweep and increment. The time the caller spends between
+    two seeds is not inside any phase. Trees rebuilt by the pool are counted
+    in pmiia_rebuild as a whole and not in the search counters.
+    With a checkpoint path the state after initialization is written to it
+    and every iteration appends what it changed, see checkpoint.py. With
+    resume too and an existing checkpoint, the state is read from it
+    instead of being built: the seeds it holds are yielded again with their
+    recorded elapsed times and the run goes on from there, choosing the
+    same seeds as a run that was never interrupted.
+    index is a directory of initial forest indexes, see forestindex.py. If
+    it has one for this graph, Ep and theta the forest is opened from it
+    instead of being built; otherwise the built forest is saved there.
+    With an arena path the PMIIA trees with their ap and alpha are kept in
+    that scratch file and at most about arena_budget bytes of them in
+    memory, see arena.py; the seeds are the same. The file is removed when
+    the run ends.
+    '''
     start = time.time()
+    # the searches run on node ids; labels[u] is the node yielded for id u
+    n = graph.vcount()
+    max_dist = -math.log(theta)
+    # ties are broken by rank[u], the position of labels[u] in sorted order,
+    # and sums over trees run in an order given by the labels, so the seeds
+    # don't depend on the ids
+    byRank = sorted(range(n), key=labels.__getitem__)
+    rank = array('i', [0])*n
+    for r, u in enumerate(byRank):
+        rank[u] = r
+    isolated = isolatedNodes(graph)
+    profile.count("isolated_nodes", len(isolated))
+    print '%s of %s nodes are isolated' %(len(isolated), n)
+    if drop_isolated:
+        isolated = set(isolated)
+        roots = [v for v in byRank if v not in isolated]
+    else:
+        isolated = set()
+        roots = byRank
+    # the order networkx iterated G in, a dict keyed by label: IncInf sums up
+    # its initial terms in the same order as before G was packed, so its
+    # values and the ties between seeds come out the same to the last bit
+    roots = dict((labels[v], v) for v in roots).values()
     # initialization
     S = []
-    IncInf = dict(zip(G.nodes(), [0]*len(G)))
+    Sset = set() # S for membership tests
+    IncInf = dict(zip(range(n), [0]*n))
     PMIIA = dict() # node to tree
     PMIOA = dict()
-    PMIIA_MIP = dict() # node to MIPs (dict)
-    PMIOA_MIP = dict()
-    ap = dict()
-    alpha = dict()
-    IS = dict()
-    for v in G:
-        IS[v] = []
-        PMIIA[v], PMIIA_MIP[v] = computePMIIA(G, IS[v], v, theta, S, Ep)
-        for u in PMIIA[v]:
-            ap[(u, PMIIA[v])] = 0 # ap of u node in PMIIA[v]
-        updateAlpha(alpha, v, S, PMIIA[v], PMIIA_MIP[v], Ep, ap)
-        for u in PMIIA[v]:
-            IncInf[u] += alpha[(PMIIA[v], u)]*(1 - ap[(u, PMIIA[v])])
-    print 'Finished initialization'
-    print time.time() - start
-
-    # main loop
-    for i in range(k):
-        u, _ = max(IncInf.iteritems(), key = lambda (dk, dv): dv)
-        # print i+1, "node:", u, "-->", IncInf[u]
-        IncInf.pop(u) # exclude node u for next iterations
-        PMIOA[u], PMIOA_MIP[u] = computePMIOA(G, u, theta, S, Ep)
-        for v in PMIOA[u]:
-            for w in PMIIA[v]:
-                if w not in S + [u]:
-                    IncInf[w] -= alpha[(PMIIA[v],w)]*(1 - ap[(w, PMIIA[v])])
-
-        updateIS(IS, S, u, PMIOA_MIP, PMIIA_MIP)
-
-        S.append(u)
-
-        for v in PMIOA[u]:
-            if v != u:
-                PMIIA[v], PMIIA_MIP[v] = computePMIIA(G, IS[v], v, theta, S, Ep)
-                updateAP(ap, S, PMIIA[v], PMIIA_MIP[v], Ep)
-                updateAlpha(alpha, v, S, PMIIA[v], PMIIA_MIP[v], Ep, ap)
-                # add new incremental influence
-                for w in PMIIA[v]:
-                    if w not in S:
-                        IncInf[w] += alpha[(PMIIA[v], w)]*(1 - ap[(w, PMIIA[v])])
-
-    return S
-
-def getCoverage((G, S, Ep)):
-    return len(runIAC(G, S, Ep))
+    # per-tree arrays aligned with PMIIA[v].nodes; replacing PMIIA[v]
+    # replaces them too, so nothing keeps an old tree alive
+    ap = dict() # node to array of ap
+    alpha = dict() # node to array of alpha
+    IS = dict() # node to set of seeds blocked from it
+    treeSeeds = dict() # node to {seed: index} of the seeds in PMIIA[v]
+    pool = None
+    trees = None # the TreeArena, if any
+    if processes != 1:
+        # forked once with the graph; serves the initial build and the
+        # rebuilds of every iteration until the run ends
+        workers = processes or multiprocessing.cpu_count()
+        _shared.update(graph=graph, max_dist=max_dist, rank=rank)
+        pool = multiprocessing.Pool(processes)
+    try:
+        if arena is not None:
+            trees = TreeArena(arena, n, arena_budget, profile=profile)
+            PMIIA, ap, alpha = trees.trees, trees.aps, trees.alphas
+        if checkpoint is not None:
+            ckpt = Checkpoint(checkpoint)
+            meta = stateMeta(graph, labels, theta, drop_isolated)
+        restored = [] # (u, elapsed) of the seeds read from the checkpoint
+        resuming = resume and checkpoint is not None and ckpt.exists()
+        forest = None
+        if index is not None and not resuming:
+            with profile.phase("open_index"):
+                forest = openIndex(index, graph, labels, theta)
+        if resuming:
+            with profile.phase("restore"):
+                restored = restore(ckpt, meta, PMIIA, ap, alpha, IS, treeSeeds, IncInf)
+            for u, _ in restored:
+                S.append(u)
+                Sset.add(u)
+            print 'Resumed after %s seeds from %s' %(len(restored), checkpoint)
+        elif forest is not None:
+            # trees are read from the index when the greedy loop first needs them
+            if arena is not None:
+                trees.load = forest.entry
+                IncInf = forest.initialIncInf()
+            else:
+                PMIIA, ap, alpha, IncInf = forest.forest()
+            for v in roots:
+                IS[v] = set()
+                treeSeeds[v] = dict()
+            print 'Opened the initial forest from %s' % forest.path
+        else:
+            with profile.phase("init"):
+                if pool is None:
+                    for v in roots:
+                        IS[v] = set()
+                        with profile.phase("pmiia_build"):
+                            PMIIA[v], treeSeeds[v] = computePMIIA(graph, IS[v], v, max_dist, Sset, rank, profile)
+                        with profile.phase("sweep"):
+                            ap[v] = array('d', [0])*len(PMIIA[v]) # ap of nodes in PMIIA[v]
+                            updateAlpha(alpha, v, Sset, PMIIA[v], ap)
+                        PMIIAv, apv, alphav = PMIIA[v], ap[v], alpha[v]
+                        for i, u in enumerate(PMIIAv):
+                            IncInf[u] += alphav[i]*(1 - apv[i])
+                else:
+                    chunksize = max(1, len(roots)//(16*workers))
+                    # imap keeps the order of roots, so IncInf sums up in the same order as the serial loop
+                    for v, nodes, parents, weights, alphas in pool.imap(_computeInitialPMIIA, roots, chunksize):
+                        IS[v] = set()
+                        PMIIA[v] = Arborescence(nodes, parents, weights)
+                        treeSeeds[v] = dict()
+                        ap[v] = apv = array('d', [0])*len(nodes)
+                        alpha[v] = alphas
+                        for i, u in enumerate(nodes):
+                            IncInf[u] += alphas[i]*(1 - apv[i])
+                for v in isolated:
+                    IncInf[v] += 1 # the IncInf of v's one-node PMIIA
+            print 'Finished initialization'
+            if index is not None:
+                with profile.phase("write_index"):
+                    key = indexKey(graph, labels, theta)
+                    writeIndex(indexPath(index, key), key, n, PMIIA, alpha, IncInf)
+        if checkpoint is not None and not resuming:
+            # built or opened from an index, the initial forest is the base
+            with profile.phase("checkpoint"):
+                saveBase(ckpt, meta, roots, PMIIA, ap, alpha, IS, treeSeeds, IncInf)
+        print time.time() - start
+
+        # max-heap of (-IncInf[u], rank[u], u): ties go to the smallest label. An entry
+        # is live only while it matches IncInf[u]; updated nodes are pushed again
+        # and their older entries are dropped when they surface.
+        IncInf_heap = [(-inc, rank[u], u) for u, inc in IncInf.iteritems()]
+        heapq.heapify(IncInf_heap)
+
+        for u, elapsed in restored[:k]:
+            yield labels[u], elapsed
+        if restored:
+            start = time.time() - restored[-1][1]
+
+        # main loop
+        for i in range(len(restored), k):
+            while True:
+                neg_inc, _, u = heapq.heappop(IncInf_heap)
+                profile.count("incinf_heap_pops")
+                if IncInf.get(u) == -neg_inc:
+                    break
+            # print i+1, "node:", u, "-->", IncInf[u]
+            profile.iteration(seed=labels[u], IncInf=IncInf[u])
+            IncInf.pop(u) # exclude node u for next iterations
+            elapsed = time.time() - start
+            paused = time.time()
+            yield labels[u], elapsed
+            start += time.time() - paused # the caller's time isn't the run's
+            if i == k - 1:
+                break # updates below only matter for the next seed
+            if u in isolated:
+                S.append(u)
+                Sset.add(u)
+                if checkpoint is not None:
+                    with profile.phase("checkpoint"):
+                        saveIteration(ckpt, u, elapsed, [], [], PMIIA, ap, alpha, IS, treeSeeds, IncInf, ())
+                continue # no other PMIIA contains u, so nothing changes
+
+            touched = set()
+            with profile.phase("pmioa"):
+                PMIOA[u] = computePMIOA(graph, u, max_dist, Sset, rank, profile)
+            profile.observe("pmioa_size", len(PMIOA[u]))
+            # the trees u reaches, in the order networkx iterated PMIOA(u) when
+            # it was a DiGraph: its node dict keyed by label, filled in the order
+            # the nodes were reached. A node's IncInf terms are then taken off
+            # and added back in the same order as before, so its value and the
+            # ties between seeds come out the same to the last bit
+            affected = dict((labels[v], v) for v in PMIOA[u]).values()
+            with profile.phase("decrement"):
+                for v in affected:
+                    PMIIAv, apv, alphav = PMIIA[v], ap[v], alpha[v]
+                    for i, w in enumerate(PMIIAv):
+                        if w != u and w not in Sset:
+                            IncInf[w] -= alphav[i]*(1 - apv[i])
+                            touched.add(w)
+
+            with profile.phase("update_is"):
+                updateIS(IS, treeSeeds, u, PMIOA, PMIIA)
+
+            S.append(u)
+            Sset.add(u)
+
+            rebuilt = [v for v in affected if v != u]
+            if pool is not None and len(rebuilt) >= PARALLEL_REBUILD:
+                size = -(-len(rebuilt)//(4*workers))
+                batches = [(Sset, [(v, IS[v]) for v in rebuilt[j:j+size]]) for j in range(0, len(rebuilt), size)]
+                # batches come back in order, so IncInf sums up as in the serial loop
+                with profile.phase("pmiia_rebuild"):
+                    results = pool.map(_rebuildPMIIA, batches)
+                for batch in results:
+                    for v, nodes, parents, weights, seeds, apv, alphav, increments in batch:
+                        PMIIA[v] = Arborescence(nodes, parents, weights)
+                        treeSeeds[v] = seeds
+                        ap[v] = apv
+                        alpha[v] = alphav
+                        with profile.phase("increment"):
+                            for w, increment in increments:
+                                IncInf[w] += increment
+                                touched.add(w)
+            else:
+                for v in rebuilt:
+                    with profile.phase("pmiia_rebuild"):
+                        PMIIA[v], treeSeeds[v] = computePMIIA(graph, IS[v], v, max_dist, Sset, rank, profile)
+                    with profile.phase("sweep"):
+                        updateAP(ap, Sset, v, PMIIA[v])
+                        updateAlpha(alpha, v, Sset, PMIIA[v], ap)
+                    # add new incremental influence
+                    with profile.phase("increment"):
+                        PMIIAv, apv, alphav = PMIIA[v], ap[v], alpha[v]
+                        for i, w in enumerate(PMIIAv):
+                            if w not in Sset:
+                                IncInf[w] += alphav[i]*(1 - apv[i])
+                                touched.add(w)
+
+            profile.observe("touched", len(touched))
+            profile.count("incinf_heap_pushes", len(touched))
+            for w in touched:
+                heapq.heappush(IncInf_heap, (-IncInf[w], rank[w], w))
+            if checkpoint is not None:
+                with profile.phase("checkpoint"):
+                    saveIteration(ckpt, u, elapsed, rebuilt, list(PMIOA[u]),
+                                  PMIIA, ap, alpha, IS, treeSeeds, IncInf, touched)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+            _shared.clear()
+        if trees is not None:
+            trees.close()
+
+def PMIA(G, k, theta, Ep, processes=1, drop_isolated=False, order=None, profile=NO_PROFILE,
+         checkpoint=None, resume=False, index=None, arena=None, arena_budget=DEFAULT_BUDGET):
+    return [u for u, _ in iterPMIA(G, k, theta, Ep, processes, drop_isolated, order, profile,
+                                   checkpoint, resume, index, arena, arena_budget)]
+
+def buildIndex(graph, labels, theta, directory, processes=1, profile=NO_PROFILE):
+    ''' Build the initial forest of a packed or mapped graph for theta and
+    save it in directory, so later runs with any k start from it.
+    '''
+    for _ in iterPMIAGraph(graph, labels, 0, theta, processes, profile=profile, index=directory):
+        pass
 
 if __name__ == "__main__":
     import time
@@ -213,73 +530,91 @@ if __name__ == "__main__":
 
     dataset = "gnu09"
 
-    G = nx.read_gpickle("../../graphs/%s.gpickle" %dataset)
-    print 'Read graph G'
-    print time.time() - start
-
-    Ep = dict()
-    with open("Ep_%s_%s1.txt" %(dataset, ep_model)) as f:
-        for line in f:
-            data = line.split()
-            Ep[(int(data[0]), int(data[1]))] = float(data[2])
+    # set PMIA_PROFILE to a .json or .csv path to write a phase/counter trace
+    PROFILE_FILENAME = os.environ.get("PMIA_PROFILE")
+    profile = Profile() if PROFILE_FILENAME else NO_PROFILE
+    # set PMIA_INDEX to a directory to keep the initial forest there and
+    # skip building it in later runs on the same graph, Ep and theta
+    INDEX_DIRECTORY = os.environ.get("PMIA_INDEX")
+    # set PMIA_ARENA to a scratch file to keep the PMIIA forest on disk with
+    # at most PMIA_ARENA_MB megabytes of it in memory
+    ARENA = os.environ.get("PMIA_ARENA")
+    ARENA_BUDGET = int(os.environ.get("PMIA_ARENA_MB", DEFAULT_BUDGET >> 20)) << 20
+
+    with profile.phase("load"):
+        G = nx.read_gpickle("../../graphs/%s.gpickle" %dataset)
+        print 'Read graph G'
+        print time.time() - start
+
+        Ep = dict()
+        with open("Ep_%s_%s1.txt" %(dataset, ep_model)) as f:
+            for line in f:
+                data = line.split()
+                Ep[(int(data[0]), int(data[1]))] = float(data[2])
 
     ALGO_NAME = "PMIA"
     FOLDER = "Data4InfMax"
     SEEDS_FOLDER = "Seeds"
     TIME_FOLDER = "Time"
+    PLOT_FOLDER = "plotdata"
     DROPBOX_FOLDER = "/home/sergey/Dropbox/Influence Maximization"
     seeds_filename = SEEDS_FOLDER + "/%s_%s_%s_%s.txt" %(SEEDS_FOLDER, ALGO_NAME, dataset, model)
     time_filename = TIME_FOLDER + "/%s_%s_%s_%s.txt" %(TIME_FOLDER, ALGO_NAME, dataset, model)
+    plot_filename = PLOT_FOLDER + "/plot_%s_%s_%s.txt" %(ALGO_NAME, dataset, model)
 
     theta = 1.0/20
-    pool = None
     I = 1000
+    estimator = SpreadEstimator(G, Ep, processes=None)
     l2c = [[0, 0]]
     # open file for writing output
     seeds_file = open(seeds_filename, "a+")
     time_file = open(time_filename, "a+")
-    dbox_seeds_file = open("%/%", DROPBOX_FOLDER, seeds_filename, "a+")
-    dbox_time_file = open("%/%", DROPBOX_FOLDER, time_filename, "a+")
-    for length in range(1, 250, 5):
-        time2length = time.time()
-        print "Start finding solution for length = %s" %length
-
-        time2S = time.time()
-        S = PMIA(G, length, theta, Ep)
-        time2complete = time.time() - time2S
+    dbox_seeds_file = open("%s/%s" %(DROPBOX_FOLDER, seeds_filename), "a+")
+    dbox_time_file = open("%s/%s" %(DROPBOX_FOLDER, time_filename), "a+")
+    lengths = set(range(1, 250, 5))
+    # one greedy run up to the largest length; every requested length is a prefix of it
+    S = []
+    time2length = time.time()
+    for u, time2complete in iterPMIA(G, max(lengths), theta, Ep, profile=profile, index=INDEX_DIRECTORY,
+                                     arena=ARENA, arena_budget=ARENA_BUDGET):
+        S.append(u)
+        length = len(S)
+        if length not in lengths:
+            continue
         print >>time_file, (time2complete)
         print >>dbox_time_file, (time2complete)
-        print 'Finish finding S in %s sec...' %(time2complete)
+        print 'Finish finding S for length = %s in %s sec...' %(length, time2complete)
 
         print 'Writing S to files...'
-        print >>seeds_filename, json.dumps(S)
+        print >>seeds_file, json.dumps(S)
         print >>dbox_seeds_file, json.dumps(S)
-
-        # print "Start calculating coverage..."
-        # # def map_AvgIAC (it):
-        # #     return avgIAC(G, S, Ep, I)
-        # if pool == None:
-        #     pool = multiprocessing.Pool(processes=None)
-        # avg_size = 0
-        # time2avg = time.time()
-        # T = pool.map(getCoverage, ((G, S, Ep) for i in range(I)))
-        # avg_size = sum(T)/len(T)
-        # print 'Average coverage of %s nodes is %s' %(length, avg_size)
-        # print 'Finished averaging seed set size in', time.time() - time2avg
-        # print >>ftime, "%s %s" %(length, time.time() - time2S)
-        #
-        # l2c.append([length, avg_size])
-        # with open('plotdata/plot' + FILENAME, 'w+') as fresults:
-        #     json.dump(l2c, fresults)
-        # with open(DROPBOX + 'plotdata/plot' + FILENAME, 'w+') as fp:
-        #     json.dump(l2c, fp)
-
-        print 'Total time for length = %s: %s sec' %(length, time.time() - time2length)
+        for f in (seeds_file, dbox_seeds_file, time_file, dbox_time_file):
+            f.flush()
+
+        print "Start calculating coverage..."
+        time2avg = time.time()
+        with profile.phase("coverage"):
+            coverage = estimator.estimate(S, I, rel_tol=0.01)
+        print 'Average coverage of %s nodes is %s (95%% CI %s - %s, %s runs)' %(
+            length, coverage["mean"], coverage["ci"][0], coverage["ci"][1], coverage["runs"])
+        print 'Finished averaging seed set size in', time.time() - time2avg
+
+        l2c.append([length, coverage["mean"]])
+        with open(plot_filename, 'w+') as fresults:
+            json.dump(l2c, fresults)
+        with open("%s/%s" %(DROPBOX_FOLDER, plot_filename), 'w+') as fp:
+            json.dump(l2c, fp)
+
+        print 'Time since previous length: %s sec' %(time.time() - time2length)
         print '----------------------------------------------'
+        time2length = time.time()
 
 
+    estimator.close()
     seeds_file.close()
     dbox_seeds_file.close()
     time_file.close()
     dbox_time_file.close()
+    if PROFILE_FILENAME:
+        profile.write(PROFILE_FILENAME, dataset=dataset, model=model, theta=theta)
     print 'Total time: %s' %(time.time() - start)
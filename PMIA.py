@@ -1,17 +1,21 @@
+# -*- coding: utf-8 -*-
 '''
 物理层链路图
 '''
+from __future__ import print_function
+import heapq
+import math
+from csrgraph import CSRGraph
+from arborescence import Arborescence
+from nameindex import NameIndex
+
 # 节点类
 class Pvertex:
 	def __init__(self, vertex_id, vertex_name):
 		self.__vertex_id = vertex_id
 		self.__vertex_name = vertex_name
-		self.__listpointer = None # 出边节点
-		self.__incoming_vertex = [] # 入边节点
-		self.__visit_in_algo3 = False
-		# 以下变量用于 Dijkstra 算法
+		# 以下变量用于连通性判断
 		self.__visited = None
-		self.__distance = None
 
 	def get_name(self):
 		return self.__vertex_name
@@ -22,63 +26,16 @@ class Pvertex:
 	def get_visited(self):
 		return self.__visited
 
-	def get_distance(self):
-		return self.__distance
-
 	def set_visited(self, visited):
 		self.__visited = visited
 
-	def set_distance(self, distance):
-		self.__distance = distance
-
-	def get_listpointer(self):
-		return self.__listpointer
-
-	def set_listpointer(self, adjlist_node):
-		self.__listpointer = adjlist_node
-
-	def add_incoming_vertex(self, incoming_vertex): # 记录一下能够直接到达本节点的源点
-		self.__incoming_vertex.append(incoming_vertex)
-
-	def get_incoming_vertex(self):
-		return self.__incoming_vertex
-
-	def can_be_w_in_algo3(self):
-		return not self.__visit_in_algo3
-
-	def exclude_for_algo3(self):
-		self.__visit_in_algo3 = True
-
-# 邻接表节点类
-class Padjlist_node:
-	def __init__(self, dst_vertex_id, edge_weight, dst_vertex_name):
-		self.__dst_vertex_id = dst_vertex_id
-		self.__dst_vertex_name = dst_vertex_name
-		self.__edge_weight = edge_weight
-		self.__next = None
-
-	def get_dst_id(self):
-		return self.__dst_vertex_id
-
-	def get_dst_name(self):
-		return self.__dst_vertex_name
-
-	def get_edge_weight(self):
-		return self.__edge_weight
-
-	def get_next(self):
-		return self.__next
-
-	def set_next(self, n):
-		self.__next = n
-
 # 物理通信图类
 class Pgraph:
 	def __init__(self):
 		self.__adjlist = [] # array of pvertex
+		self.__edges = CSRGraph('d') # 边及权重，按 CSR 存放
+		self.__names = NameIndex() # 节点名称 <---> 节点下标
 		self.__count = 0
-		# 以下变量用于 Dijkstra 算法，外部不可访问，仅用于算法计算
-		self.__unvisited_count = None
 
 	def get_vcount(self):
 		return self.__count
@@ -87,39 +44,32 @@ class Pgraph:
 		return [vid for vid in range(self.__count)]
 
 	def pp(self, u, v):
-		p = self.__adjlist[u].get_listpointer()
-		while p:
-			if p.get_dst_id() == v:
-				return p.get_edge_weight()
-			p = p.get_next()
-		return 0 # u-v 没有连接
+		e = self.__edges.find_edge(u, v)
+		if e < 0:
+			return 0 # u-v 没有连接
+		return self.__edges.value(e)
 		#raise Exception("pp(u,v) doesn't exist")
 
 	def add_vertex(self, vertex_name):
-		v = Pvertex(len(self.__adjlist), vertex_name)
+		if vertex_name in self.__names:
+			raise Exception("vertex %s already exists" %vertex_name)
+		v = Pvertex(self.__names.add(vertex_name), vertex_name)
 		self.__adjlist.append(v)
+		self.__edges.add_vertex()
 		self.__count += 1
 
 	def add_edge(self, src_vertex_id, dst_vertex_id, edge_weight):
 		# 检测节点合法性
 		self.__valid_vertex(src_vertex_id)
 		self.__valid_vertex(dst_vertex_id)
-		# 从 src 到 dst
-		p = self.__adjlist[src_vertex_id].get_listpointer()
-		node = Padjlist_node(dst_vertex_id, edge_weight,
-					self.__adjlist[dst_vertex_id].get_name())
-		node.set_next(p)
-		self.__adjlist[src_vertex_id].set_listpointer(node)
-		# 记录下来源，提高反向查找效率
-		self.__adjlist[dst_vertex_id].add_incoming_vertex(src_vertex_id)
+		# 从 src 到 dst，入边反向索引由 CSRGraph 一并维护
+		self.__edges.add_edge(src_vertex_id, dst_vertex_id, edge_weight)
 
 	def dump(self):
 		for vertex in self.__adjlist:
 			print("%d(%s):" %(vertex.get_id(), vertex.get_name()), end='')
-			p = vertex.get_listpointer()
-			while p:
-				print(" %d(%s)" %(p.get_dst_id(), p.get_dst_name()), end='')
-				p = p.get_next()
+			for dst in self.__edges.out_neighbors(vertex.get_id()):
+				print(" %d(%s)" %(dst, self.__adjlist[dst].get_name()), end='')
 			print()
 
 	def __valid_vertex(self, vertex):
@@ -127,57 +77,33 @@ class Pgraph:
 			raise Exception("vertex %d doesn't exist" %vertex)
 
 	'''
-	下面的两个函数用于计算最短路径
+	下面的函数用于计算最短路径
 	'''
-	# 返回值是 Pvertex 对象引用
-	def find_min_distance_vertex(self):
-		min_distance = float("inf")
-		min_distance_vertex = None
-		for v in self.__adjlist:
-			if not v.get_visited() and v.get_distance() < min_distance:
-				min_distance = v.get_distance()
-				min_distance_vertex = v
-		return min_distance_vertex
-	# 返回值是个 id list
-	def shortest_path(self, from_vertex, to_vertex):
-		# 初始化所有节点的状态
-		for v in self.__adjlist:
-			v.set_visited(False)
-			v.set_distance(float("inf"))
-		# 设定起点
-		# self.__adjlist[from_vertex].__visited = true
-		self.__adjlist[from_vertex].set_distance(0)
-		# 设定未访问的节点数
-		self.__unvisited_count = len(self.__adjlist)
-		# 算法核心
+	# 单源 Dijkstra，用二叉堆取最小距离节点，复杂度 O((V+E)logV)
+	# 一次运行返回 from_vertex 到所有可达节点的距离和前驱，调用者可以从中读取多个目标
+	def dijkstra(self, from_vertex):
+		distance = {from_vertex: 0}
 		prev = dict()
-		while self.__unvisited_count != 0:
-			'''
-			如果 min_distance_vertex 是 None，则结束路径探测
-			1. 对于无向图来讲，剩下的节点都是孤立节点
-			2. 对于有向图来讲，剩下的节点可能是孤立节点或者是由于方向原因无法从 from_vertex 访问到
-			'''
-			min_distance_vertex = self.find_min_distance_vertex()
-			if min_distance_vertex is None:
-				break
-
-			p = min_distance_vertex.get_listpointer()
-			# 如果 min_distance_vertex 的邻接表为空，说明它向后不连接任何点，我们跳过这个点继续找下一个 min_distance_vertex
-			if p is None:
-				min_distance_vertex.set_visited(True)
-				self.__unvisited_count -= 1
+		visited = set()
+		# 距离相同时按 id 从小到大出堆，和原来线性扫描的选点顺序一致
+		heap = [(0, from_vertex)]
+		while heap:
+			min_distance, vid = heapq.heappop(heap)
+			if vid in visited: # 堆里残留的旧距离，跳过
 				continue
-
-			while p:
-				p_distance = self.__adjlist[p.get_dst_id()].get_distance()
-				sum_distance = min_distance_vertex.get_distance() + p.get_edge_weight()
-				if sum_distance < p_distance:
-					self.__adjlist[p.get_dst_id()].set_distance(sum_distance)
-					prev[p.get_dst_id()] = min_distance_vertex.get_id()
-				p = p.get_next()
-			min_distance_vertex.set_visited(True)
-			self.__unvisited_count -= 1
-
+			visited.add(vid)
+			for dst, weight in zip(self.__edges.out_neighbors(vid), self.__edges.out_values(vid)):
+				sum_distance = min_distance + weight
+				if sum_distance < distance.get(dst, float("inf")):
+					distance[dst] = sum_distance
+					prev[dst] = vid
+					heapq.heappush(heap, (sum_distance, dst))
+		return distance, prev
+
+	# 返回值是个 id list；prev 可以传入 dijkstra() 的结果，避免重复计算
+	def shortest_path(self, from_vertex, to_vertex, prev=None):
+		if prev is None:
+			_, prev = self.dijkstra(from_vertex)
 		path = [to_vertex]
 		# 若 prev 字典里没记录从哪能到 to_vertex，说明到 to_vertex 不可达
 		if to_vertex not in prev:
@@ -191,12 +117,10 @@ class Pgraph:
 		return path
 
 	def weight_on_edge(self, src, dst):
-		p = self.__adjlist[src].get_listpointer()
-		while p:
-			if p.get_dst_id() == dst:
-				return p.get_edge_weight()
-			p = p.get_next()
-		return -1
+		e = self.__edges.find_edge(src, dst)
+		if e < 0:
+			return -1
+		return self.__edges.value(e)
 
 # 判断两点之间是否连通
 	def is_connected(self, start, end):
@@ -207,10 +131,7 @@ class Pgraph:
 		current_id = start
 		for each in self.__adjlist:
 			each.set_visited(False)
-		p = self.__adjlist[start].get_listpointer()
-		while p:
-			stack.append(p.get_dst_id())
-			p = p.get_next()
+		stack.extend(self.__edges.out_neighbors(start))
 		while len(stack) != 0:
 			current_id = stack.pop()
 			if current_id == end:
@@ -219,10 +140,7 @@ class Pgraph:
 			if current_vertex.get_visited():
 				continue
 			current_vertex.set_visited(True)
-			p = self.__adjlist[current_id].get_listpointer()
-			while p:
-				stack.append(p.get_dst_id())
-				p = p.get_next()
+			stack.extend(self.__edges.out_neighbors(current_id))
 		if current_id == end:
 			return True
 		else:
@@ -246,89 +164,88 @@ class Pgraph:
 
 	# 入邻居
 	def get_inneighbor_vertex(self, v):
-		inneighbor = []
-		for vobj in self.__adjlist:
-			p = vobj.get_listpointer()
-			while p:
-				if p.get_dst_id() == v:
-					inneighbor.append(vobj.get_id())
-					break
-				p = p.get_next()
-		return inneighbor
+		return list(self.__edges.in_neighbors(v))
+
+	# 入边，返回 [(入邻居, pp(入邻居, v)), ...]，直接读反向索引，不用再逐个调用 pp 查找
+	def get_inneighbor_edges(self, v):
+		return list(zip(self.__edges.in_neighbors(v), self.__edges.in_values(v)))
 
 	# 出邻居
 	def get_outneighbor_vertex(self, v):
-		outneighbor = []
-		p = self.__adjlist[v].get_listpointer()
-		while p:
-			outneighbor.append(p.get_dst_id())
-			p = p.get_next()
-		return outneighbor
-
-	def mip(self, u, v):
+		return list(self.__edges.out_neighbors(v))
+
+	def mip(self, u, v, prev=None):
 		pai = 1 # 求积运算
-		path = self.shortest_path(u, v) # 计算 u, v 之间的最短路径
+		path = self.shortest_path(u, v, prev) # 计算 u, v 之间的最短路径
 		for i in range(len(path)-1): # 对路径上的权重求积
 			pai = pai * self.weight_on_edge(path[i], path[i+1])
 		return pai
 
-	def miia(self, v, theta):
-		union = []
-		for u in self.get_input_vertex(v):
-			tmp_mip = self.mip(u, v)
-			if tmp_mip < theta:
+	'''
+	以 root 为根生长最大影响树：边长取 -log(pp)，一次 Dijkstra 得到所有最大影响路径（MIP），
+	路径概率低于 theta（即距离超过 -log(theta)）的节点不再入堆，所以只访问树内节点及其邻边
+	reverse 为 True 时沿入边生长，得到 MIIA；否则沿出边生长，得到 MIOA
+	返回 (order, parent, weight)：order 是按出堆顺序排列的节点 id，根在最前；
+	parent[u] 是 u 在 MIP 上朝向根的相邻节点，weight[u] 是这条边的 pp
+	'''
+	def bounded_arborescence(self, root, theta, reverse):
+		cutoff = -math.log(theta)
+		distance = {root: 0}
+		parent = dict()
+		weight = dict()
+		order = []
+		visited = set()
+		heap = [(0, root)]
+		while heap:
+			min_distance, vid = heapq.heappop(heap)
+			if vid in visited:
 				continue
-			union.append(u)
-		return union
+			visited.add(vid)
+			order.append(vid)
+			if reverse:
+				edges = self.get_inneighbor_edges(vid)
+			else:
+				edges = zip(self.__edges.out_neighbors(vid), self.__edges.out_values(vid))
+			for nbr, pp in edges:
+				if pp <= 0 or nbr in visited:
+					continue
+				sum_distance = min_distance - math.log(pp)
+				if sum_distance > cutoff: # pp(MIP) < theta
+					continue
+				if sum_distance < distance.get(nbr, float("inf")):
+					distance[nbr] = sum_distance
+					parent[nbr] = vid
+					weight[nbr] = pp
+					heapq.heappush(heap, (sum_distance, nbr))
+		return order, parent, weight
+
+	def miia(self, v, theta):
+		order, _, _ = self.bounded_arborescence(v, theta, True)
+		return sorted(order[1:])
 
 	def mioa(self, v, theta):
-		union = []
-		for u in self.get_output_vertex(v):
-			tmp_mip = self.mip(v, u)
-			if tmp_mip < theta:
-				continue
-			union.append(u)
-		return union
+		order, _, _ = self.bounded_arborescence(v, theta, False)
+		return sorted(order[1:])
 
 	def vertex_id_to_name(self, id):
-		return self.__adjlist[id].get_name()
-
-	def ap(self, u, S, miia_union):
-		if u in miia_union: # 根据初始化的代码推知
-			return 0
-		if u in S:
-			return 1
-		inneighbor = self.get_inneighbor_vertex(u)
-		if len(inneighbor) == 0:
-			return 0
-		product = 1
-		for w in inneighbor:
-			product *= 1 - self.ap(w, S, miia_union) * self.pp(w, u)
-		return 1 - product
-
-	# TODO
-	def alpha(self, v, u, S, miia_union):
-		if v == u:
-			return 1
-		'''
-		w = None
-		for pickup_v in self.get_outneighbor_vertex(u):
-			if self.__adjlist[pickup_v].can_be_w_in_algo3():
-				w = pickup_v
-				self.__adjlist[pickup_v].exclude_for_algo3()
-				break
-		if w is None:
-			raise Exception("Cannot find a usable w in alog3")
-		'''
-		w = self.get_outneighbor_vertex(u)[0]
-		if w in S:
-			return 0
-		pai = 1
-		for u_quote in self.get_input_vertex(w):
-			if u_quote == u:
-				continue
-			pai *= (1 - self.ap(u_quote, S, miia_union) * self.pp(u_quote, w))
-		return self.alpha(v, w, S, miia_union) * self.pp(u, w) * pai
+		return self.__names.name(id)
+
+	def vertex_name_to_id(self, name):
+		return self.__names.id(name)
+
+	# MIIA(v, theta) 对应的树，ap / alpha 都在这棵树上计算
+	def miia_tree(self, v, theta):
+		return Arborescence.from_parent_map(*self.bounded_arborescence(v, theta, True))
+
+	# u 在 tree 中的激活概率 ap(u, S, MIIA(v))
+	def ap(self, u, S, tree):
+		ap, _ = tree.sweep(S)
+		return ap[tree.index(u)]
+
+	# alpha(v, u)，tree 是以 v 为根的 MIIA 树
+	def alpha(self, v, u, S, tree):
+		_, alpha = tree.sweep(S)
+		return alpha[tree.index(u)]
 
 
 def test(pgraph, vertex_count, theta):
@@ -404,12 +321,15 @@ if __name__ == '__main__':
 		IncInf[v] = 0
 	for vid in V:
 		IncInf[vid] = 0
-	MIIA = dict() # vid <---> set()
+	MIIA = dict() # vid <---> Arborescence
 	MIOA = dict()
 	for v in V:
-		MIIA[v] = pgraph.miia(v, theta)
+		MIIA[v] = pgraph.miia_tree(v, theta)
 		MIOA[v] = pgraph.mioa(v, theta)
-		for u in MIIA[v]:
-			IncInf[u] += pgraph.alpha(v, u, S, MIIA[v]) * (1 - pgraph.ap(u, S, MIIA[v]))
+		# 每棵树只扫两遍，ap 从叶子到根，alpha 从根到叶子
+		ap, alpha = MIIA[v].sweep(S)
+		for i, u in enumerate(MIIA[v]):
+			IncInf[u] += alpha[i] * (1 - ap[i])
+	print("IncInf:", IncInf)
 
 	# Main Loop
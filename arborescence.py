@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+'''
+最大影响树（MIIA / MIOA）
+
+树里的节点按拓扑序存放：nodes[0] 是根，父节点总排在子节点前面，
+所以倒序遍历就是从叶子到根，正序遍历就是从根到叶子。
+parent[i] 是 nodes[i] 的父节点下标（根为 -1），weight[i] 是 nodes[i] 与父节点之间边的 pp，
+子节点用 child_offsets / children 两个数组按 CSR 方式存放。
+MIP 不单独保存：u 到根的路径就是沿 parent 往上走，
+“u 在 w 到根的路径上”等价于 u 是 w 的祖先，用 DFS 进出时间戳 O(1) 判断。
+'''
+from array import array
+from csrgraph import ID_TYPECODE
+
+
+class Arborescence(object):
+	# 森林里可能有上百万棵树，不给每个对象建 __dict__
+	__slots__ = ('nodes', 'parent', 'weight', 'depth', 'child_offsets', 'children',
+			'__sorted_nodes', '__sorted_index', '__enter', '__leave',
+			'__cached_seeds', '__ap', '__alpha')
+
+	def __init__(self, nodes, parent, weight):
+		self.nodes = array(ID_TYPECODE, nodes)
+		self.parent = array(ID_TYPECODE, parent)
+		self.weight = array('d', weight)
+		n = len(self.nodes)
+		self.depth = array(ID_TYPECODE, [0]) * n
+		child_offsets = array(ID_TYPECODE, [0]) * (n + 1)
+		for i in range(1, n):
+			self.depth[i] = self.depth[self.parent[i]] + 1
+			child_offsets[self.parent[i]+1] += 1
+		for i in range(n):
+			child_offsets[i+1] += child_offsets[i]
+		self.child_offsets = child_offsets
+		self.children = array(ID_TYPECODE, [0]) * max(n - 1, 0)
+		fill = child_offsets[:n]
+		for i in range(1, n):
+			self.children[fill[self.parent[i]]] = i
+			fill[self.parent[i]] += 1
+		# 节点 id 到下标的查找表，按 id 排序后二分，第一次查找时才建
+		self.__sorted_nodes = None
+		self.__sorted_index = None
+		# DFS 时间戳，第一次做祖先判断时才建
+		self.__enter = None
+		self.__leave = None
+		# 缓存最近一次 ap / alpha 的计算结果，键是树内的种子节点集合
+		self.__cached_seeds = None
+		self.__ap = None
+		self.__alpha = None
+
+	# order 是出堆顺序（根在最前），parent / weight 是以节点 id 为键的字典
+	@classmethod
+	def from_parent_map(cls, order, parent, weight):
+		position = dict((u, i) for i, u in enumerate(order))
+		parent_index = [-1] + [position[parent[u]] for u in order[1:]]
+		edge_weight = [0] + [weight[u] for u in order[1:]]
+		return cls(order, parent_index, edge_weight)
+
+	def root(self):
+		return self.nodes[0]
+
+	def __len__(self):
+		return len(self.nodes)
+
+	def __iter__(self):
+		return iter(self.nodes)
+
+	def __contains__(self, u):
+		return self.index(u) >= 0
+
+	# 节点 id 在 nodes 里的下标，不在树里返回 -1
+	def index(self, u):
+		if self.__sorted_nodes is None:
+			order = sorted(range(len(self.nodes)), key=lambda i: self.nodes[i])
+			self.__sorted_nodes = array(ID_TYPECODE, [self.nodes[i] for i in order])
+			self.__sorted_index = array(ID_TYPECODE, order)
+		lo, hi = 0, len(self.__sorted_nodes)
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if self.__sorted_nodes[mid] < u:
+				lo = mid + 1
+			else:
+				hi = mid
+		if lo < len(self.__sorted_nodes) and self.__sorted_nodes[lo] == u:
+			return self.__sorted_index[lo]
+		return -1
+
+	def child_range(self, i):
+		return self.child_offsets[i], self.child_offsets[i+1]
+
+	# 下标 i 是否是下标 j 的祖先（含 i == j），即 nodes[i] 在 nodes[j] 到根的 MIP 上
+	def is_ancestor(self, i, j):
+		if self.__enter is None:
+			self.__stamp()
+		return self.__enter[i] <= self.__enter[j] <= self.__leave[i]
+
+	# 先序遍历给每个节点编号，子树正好占 [enter, enter + 子树大小 - 1] 这一段
+	def __stamp(self):
+		n = len(self.nodes)
+		size = array(ID_TYPECODE, [1]) * n
+		for i in range(n - 1, 0, -1):
+			size[self.parent[i]] += size[i]
+		enter = array(ID_TYPECODE, [0]) * n
+		leave = array(ID_TYPECODE, [0]) * n
+		clock = 0
+		stack = [0] if n else []
+		while stack:
+			i = stack.pop()
+			enter[i] = clock
+			leave[i] = clock + size[i] - 1
+			clock += 1
+			start, end = self.child_range(i)
+			stack.extend(self.children[start:end])
+		self.__enter = enter
+		self.__leave = leave
+
+	'''
+	ap(u) = 1 - Π(1 - ap(w)·pp(w, u))，w 取 u 的所有子节点，种子为 1，叶子为 0
+	从叶子到根扫一遍，线性时间
+	'''
+	def compute_ap(self, S):
+		n = len(self.nodes)
+		ap = array('d', [0.0]) * n
+		for i in range(n - 1, -1, -1):
+			if self.nodes[i] in S:
+				ap[i] = 1
+				continue
+			start, end = self.child_range(i)
+			if start == end:
+				continue
+			product = 1
+			for c in self.children[start:end]:
+				product *= 1 - ap[c] * self.weight[c]
+			ap[i] = 1 - product
+		return ap
+
+	'''
+	alpha(u) = alpha(w)·pp(u, w)·Π(1 - ap(u')·pp(u', w))，w 是 u 的父节点，u' 取 w 的其他子节点；
+	w 是种子时为 0，根为 1
+	从根到叶子扫一遍。兄弟节点的连乘按子节点顺序从左往右乘，和逐个兄弟相乘的写法浮点结果完全一样，
+	IncInf 的并列情况才不会因为舍入不同而变；前面兄弟的部分积共用，每个父节点 O(子节点数²) 次乘法
+	'''
+	def compute_alpha(self, S, ap):
+		n = len(self.nodes)
+		alpha = array('d', [0.0]) * n
+		if n == 0:
+			return alpha
+		alpha[0] = 1
+		for w in range(n):
+			start, end = self.child_range(w)
+			if start == end or self.nodes[w] in S or alpha[w] == 0:
+				continue
+			children = self.children[start:end]
+			factors = [1 - ap[c] * self.weight[c] for c in children]
+			prefix = 1 # 前 j 个兄弟的积
+			for j, c in enumerate(children):
+				product = prefix
+				for f in factors[j+1:]:
+					product *= f
+				alpha[c] = alpha[w] * self.weight[c] * product
+				prefix *= factors[j]
+		return alpha
+
+	# 返回 (ap, alpha) 两个数组，与 nodes 对齐；树内种子不变时直接用缓存。
+	# 树内种子集合从 S 和树中较小的一边求：种子通常远少于树的节点，
+	# 对树里每个节点各查一次 ap / alpha 时每次只花 O(|S|)，不会每次都扫一遍整棵树
+	def sweep(self, S):
+		if len(S) < len(self.nodes):
+			seeds = frozenset(u for u in S if u in self)
+		else:
+			seeds = frozenset(u for u in self.nodes if u in S)
+		if seeds != self.__cached_seeds:
+			self.__ap = self.compute_ap(seeds)
+			self.__alpha = self.compute_alpha(seeds, self.__ap)
+			self.__cached_seeds = seeds
+		return self.__ap, self.__alpha
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+''' Out-of-core storage for the PMIIA forest.
+
+A TreeArena keeps PMIIA[v] with its ap and alpha arrays for every node v
+in a scratch file and only a working set of them in memory, within a byte
+budget. Entries are kept in least-recently-used order: looking one up
+moves it to the back, and when the working set grows past the budget the
+entries at the front are dropped, after their arrays (node ids, parent
+indices, Ep to parent, ap, alpha) are appended to the file if they
+changed since they were read. A dropped entry is paged in again from a
+memory mapping of the file the next time it is looked up. The most
+recent entry is never dropped, so a tree stays in memory while it is
+rebuilt and its ap and alpha are swept.
+
+The greedy loop only touches the trees of the nodes in PMIOA(u) of each
+new seed u, so the working set stays small. The forest is written out
+once while it is built. After that each rebuilt tree is appended when
+it is dropped, and the space of the tree it replaced is not reused:
+the file is scratch space for one run. The arena owns it: close() unmaps
+and removes it, and the caller must close the arena when the run ends.
+
+trees, aps and alphas are dict-like views of the entries for code written
+against the PMIIA, ap and alpha dicts. With load, nodes never stored in
+the arena are read from load(v) -> (tree, ap, alpha) instead, e.g. from a
+forestindex.ForestIndex.
+'''
+
+import os, mmap
+from array import array
+from collections import OrderedDict
+from arborescence import Arborescence
+from csrgraph import ID_TYPECODE, OFFSET_TYPECODE
+from instrument import NO_PROFILE
+
+# rough bytes held per tree node (the tree's arrays, its lazily built
+# index and timestamps, ap and alpha) and per tree object
+NODE_BYTES = 64
+TREE_BYTES = 512
+DEFAULT_BUDGET = 1 << 30
+
+def _fromBytes(typecode, data):
+    values = array(typecode)
+    if hasattr(values, "frombytes"):
+        values.frombytes(data)
+    else:
+        values.fromstring(data)
+    return values
+
+class _View(object):
+    ''' One slot (tree, ap or alpha) of the arena's entries as a dict. '''
+    def __init__(self, arena, slot):
+        self.arena = arena
+        self.slot = slot
+
+    def __getitem__(self, v):
+        return self.arena.entry(v)[self.slot]
+
+    def __setitem__(self, v, value):
+        self.arena.set(v, self.slot, value)
+
+    def __contains__(self, v):
+        return self.arena.has(v)
+
+class TreeArena(object):
+    def __init__(self, path, n, budget, load=None, profile=NO_PROFILE):
+        self.path = path
+        self.budget = budget
+        self.load = load
+        self.profile = profile
+        self.file = open(path, "w+b")
+        self.mapped = None
+        self.mapped_size = 0
+        self.size = 0 # bytes written
+        self.offsets = array(OFFSET_TYPECODE, [-1])*n # file position of v's entry, -1 if none
+        self.counts = array(ID_TYPECODE, [0])*n # nodes in v's stored tree
+        self.cache = OrderedDict() # node to [tree, ap, alpha, changed]
+        self.used = 0 # bytes of the entries in cache
+        self.trees = _View(self, 0)
+        self.aps = _View(self, 1)
+        self.alphas = _View(self, 2)
+
+    def has(self, v):
+        return v in self.cache or self.offsets[v] >= 0 or self.load is not None
+
+    def entry(self, v):
+        cache = self.cache
+        entry = cache.pop(v, None)
+        if entry is None:
+            entry = self.__pageIn(v)
+            self.used += self.__bytes(entry)
+            cache[v] = entry
+            self.__evict()
+        else:
+            cache[v] = entry
+        return entry
+
+    def set(self, v, slot, value):
+        entry = self.cache.pop(v, None)
+        if entry is None:
+            entry = [None, None, None, True]
+        else:
+            self.used -= self.__bytes(entry)
+        entry[slot] = value
+        entry[3] = True
+        self.used += self.__bytes(entry)
+        self.cache[v] = entry
+        self.__evict()
+
+    def close(self):
+        ''' Unmap, close and remove the scratch file. '''
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+        if not self.file.closed:
+            self.file.close()
+            os.remove(self.path)
+
+    def __bytes(self, entry):
+        return TREE_BYTES + NODE_BYTES*(len(entry[0]) if entry[0] is not None else 0)
+
+    def __evict(self):
+        cache = self.cache
+        while self.used > self.budget and len(cache) > 1:
+            v, entry = cache.popitem(last=False)
+            self.used -= self.__bytes(entry)
+            if entry[3]:
+                self.__write(v, entry)
+            self.profile.count("arena_evictions")
+
+    def __write(self, v, entry):
+        tree, ap, alpha = entry[:3]
+        self.file.seek(self.size)
+        for data in (tree.nodes, tree.parent, tree.weight, ap, alpha):
+            data.tofile(self.file)
+        self.offsets[v] = self.size
+        self.counts[v] = len(tree)
+        self.size = self.file.tell()
+        self.profile.count("arena_writes")
+
+    def __pageIn(self, v):
+        self.profile.count("arena_page_ins")
+        start = self.offsets[v]
+        if start < 0:
+            if self.load is None:
+                raise KeyError(v)
+            tree, ap, alpha = self.load(v)
+            return [tree, ap, alpha, False]
+        if self.mapped_size < self.size:
+            # map the file again now that it has grown
+            self.file.flush()
+            if self.mapped is not None:
+                self.mapped.close()
+            self.mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.mapped_size = self.size
+        count = self.counts[v]
+        arrays = []
+        for typecode in (ID_TYPECODE, ID_TYPECODE, 'd', 'd', 'd'):
+            end = start + count*array(typecode).itemsize
+            arrays.append(_fromBytes(typecode, self.mapped[start:end]))
+            start = end
+        nodes, parents, weights, ap, alpha = arrays
+        return [Arborescence(nodes, parents, weights), ap, alpha, False]
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+''' Deterministic benchmark of the PMIA implementations.
+
+Generates seeded synthetic graphs (Barabasi-Albert, directed power-law,
+grid and, as a degenerate case, no edges at all) at several sizes, draws
+Ep from the trivalency, random, degree or pruned model (every Ep below
+theta, so pruning leaves no edges), and runs each engine on every (graph, model) case. One JSON record
+per run holds the time spent in each phase (load, pack, init, main loop
+and every iteration) and the seeds found.
+
+Engines:
+    pgraph    PMIA.py's Pgraph: MIIA/MIOA of every node and the initial
+              IncInf. PMIA.py has no main loop, so its only seed is the
+              IncInf argmax.
+    networkx  PMIA() of PMIA-github-py2.py on a networkx graph.
+    pool      the same with the initial forest built on 2 processes.
+    mapped    adjlist/ep text files converted by graphfile.py, mapped
+              back and run with iterPMIAGraph().
+    bfs, rcm, degree
+              the networkx engine on a reordered graph (reorder.py).
+
+Seeds are compared with the networkx engine: the engines built on
+iterPMIA must match it exactly and a mismatch makes the run exit with
+status 1. For pgraph only the first seed is compared and a mismatch is
+only reported, since Pgraph keeps paths of probability exactly theta and
+breaks Dijkstra ties in its own way.
+Engines whose modules don't import in the running interpreter (the
+networkx scripts are Python 2) are recorded as skipped.
+
+    python benchmark.py --sizes 500,2000 --graphs ba,powerlaw,grid \\
+        --models trivalency,random,degree -k 20 --output bench.json
+'''
+
+from __future__ import division, print_function
+import sys, os, math, time, json, random, bisect, shutil, tempfile, argparse, zlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+GRAPHS = ("ba", "powerlaw", "grid", "empty")
+MODELS = ("trivalency", "random", "degree", "pruned")
+ENGINES = ("pgraph", "networkx", "pool", "mapped", "bfs", "rcm", "degree")
+# engines that must give exactly the networkx seeds
+EXACT = ("networkx", "pool", "mapped", "bfs", "rcm", "degree")
+
+clock = getattr(time, "perf_counter", time.time)
+
+def baGraph(n, rnd, m=3):
+    ''' Barabasi-Albert graph: each new node links to m distinct earlier
+    nodes chosen proportionally to their degree; every link becomes two arcs.
+    '''
+    edges = []
+    targets = list(range(m))
+    repeated = []
+    for u in range(m, n):
+        for v in targets:
+            edges += [(u, v), (v, u)]
+        repeated += targets + [u]*m
+        chosen = set()
+        while len(chosen) < m:
+            chosen.add(rnd.choice(repeated))
+        targets = sorted(chosen)
+    return n, edges
+
+def powerlawGraph(n, rnd, avg_degree=4, gamma=2.5):
+    ''' Directed Chung-Lu graph: sources and targets are drawn from the same
+    power-law weights (exponent gamma) under independent node rankings.
+    '''
+    cumulative = []
+    total = 0
+    for i in range(n):
+        total += (i + 1)**(-1/(gamma - 1))
+        cumulative.append(total)
+    out_rank = list(range(n))
+    in_rank = list(range(n))
+    rnd.shuffle(out_rank)
+    rnd.shuffle(in_rank)
+    edges = set()
+    while len(edges) < avg_degree*n:
+        u = out_rank[bisect.bisect(cumulative, rnd.random()*total)]
+        v = in_rank[bisect.bisect(cumulative, rnd.random()*total)]
+        if u != v:
+            edges.add((u, v))
+    return n, sorted(edges)
+
+def gridGraph(n, rnd):
+    ''' side x side grid with side = floor(sqrt(n)); arcs both ways. '''
+    side = int(math.sqrt(n))
+    edges = []
+    for r in range(side):
+        for c in range(side):
+            u = r*side + c
+            if c + 1 < side:
+                edges += [(u, u + 1), (u + 1, u)]
+            if r + 1 < side:
+                edges += [(u, u + side), (u + side, u)]
+    return side*side, edges
+
+def emptyGraph(n, rnd):
+    ''' n nodes and no edges. '''
+    return n, []
+
+GENERATORS = {"ba": baGraph, "powerlaw": powerlawGraph, "grid": gridGraph, "empty": emptyGraph}
+
+def edgeProbabilities(model, edges, rnd, theta):
+    ''' Ep for the trivalency model (0.1, 0.01 or 0.001 at random), the
+    random model (uniform in [0, 0.1)), the degree model (1/indegree) or the
+    pruned model (theta/2 everywhere).
+    '''
+    if model == "trivalency":
+        return dict((e, rnd.choice((0.1, 0.01, 0.001))) for e in edges)
+    if model == "random":
+        return dict((e, rnd.uniform(0, 0.1)) for e in edges)
+    if model == "degree":
+        indegree = dict()
+        for _, v in edges:
+            indegree[v] = indegree.get(v, 0) + 1
+        return dict((e, 1/indegree[e[1]]) for e in edges)
+    if model == "pruned":
+        return dict((e, theta/2) for e in edges)
+    raise Exception("unknown Ep model %r" % model)
+
+def makeCase(graph, size, model, seed, theta):
+    ''' Generate one benchmark case; nodes get a seeded random labelling, as
+    in SNAP datasets, so ids carry no locality.
+    '''
+    rnd = random.Random(zlib.crc32(("%s-%s-%s-%s" % (graph, size, model, seed)).encode("ascii")))
+    n, edges = GENERATORS[graph](size, rnd)
+    labels = list(range(n))
+    rnd.shuffle(labels)
+    edges = sorted((labels[u], labels[v]) for u, v in edges)
+    return {"graph": graph, "size": size, "model": model, "n": n, "m": len(edges),
+            "nodes": list(range(n)), "edges": edges,
+            "Ep": edgeProbabilities(model, edges, rnd, theta)}
+
+class quiet(object):
+    ''' Silence the progress prints of the engines. '''
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+    def __exit__(self, *exc):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+def loadScript(name, path):
+    try:
+        import imp
+        return imp.load_source(name, path)
+    except ImportError:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+def timeSeeds(iterator, phases):
+    ''' Drain an iterPMIA generator; the first seed comes right after the
+    initialization, the others one main-loop iteration apart.
+    '''
+    seeds, elapsed = [], []
+    for u, t in iterator:
+        seeds.append(u)
+        elapsed.append(t)
+    phases["init"] = elapsed[0]
+    phases["main"] = elapsed[-1] - elapsed[0]
+    return seeds, [b - a for a, b in zip(elapsed, elapsed[1:])]
+
+def runPgraph(case, k, theta, tmpdir):
+    import PMIA
+    phases = dict()
+    start = clock()
+    pgraph = PMIA.Pgraph()
+    for u in sorted(case["nodes"]):
+        pgraph.add_vertex(u)
+    for u, v in case["edges"]:
+        pgraph.add_edge(pgraph.vertex_name_to_id(u), pgraph.vertex_name_to_id(v), case["Ep"][(u, v)])
+    phases["load"] = clock() - start
+    start = clock()
+    S = set()
+    IncInf = [0]*pgraph.get_vcount()
+    for v in pgraph.get_vidlist():
+        tree = pgraph.miia_tree(v, theta)
+        pgraph.mioa(v, theta)
+        ap, alpha = tree.sweep(S)
+        for i, u in enumerate(tree):
+            IncInf[u] += alpha[i]*(1 - ap[i])
+    first = min(pgraph.get_vidlist(), key=lambda u: (-IncInf[u], u))
+    phases["init"] = clock() - start
+    return phases, [pgraph.vertex_id_to_name(first)], []
+
+def runNetworkx(case, k, theta, tmpdir, **options):
+    import networkx as nx
+    module = loadScript("pmia_networkx", os.path.join(HERE, "PMIA-github-py2.py"))
+    phases = dict()
+    start = clock()
+    G = nx.DiGraph()
+    G.add_nodes_from(case["nodes"])
+    G.add_edges_from(case["edges"])
+    phases["load"] = clock() - start
+    start = clock()
+    iterator = module.iterPMIA(G, k, theta, case["Ep"], **options)
+    phases["pack"] = clock() - start
+    seeds, iterations = timeSeeds(iterator, phases)
+    return phases, seeds, iterations
+
+def runMapped(case, k, theta, tmpdir):
+    module = loadScript("pmia_networkx", os.path.join(HERE, "PMIA-github-py2.py"))
+    import graphfile
+    adjlist, ep, path = [os.path.join(tmpdir, name) for name in ("adjlist.txt", "ep.txt", "graph.csr")]
+    successors = dict((u, []) for u in case["nodes"])
+    for u, v in case["edges"]:
+        successors[u].append(v)
+    with open(adjlist, "w") as f:
+        for u in case["nodes"]:
+            f.write(" ".join(str(x) for x in [u] + successors[u]) + "\n")
+    with open(ep, "w") as f:
+        for u, v in case["edges"]:
+            f.write("%s %s %r\n" % (u, v, case["Ep"][(u, v)]))
+    phases = dict()
+    start = clock()
+    graphfile.writeGraph(path, *graphfile.convert(adjlist, ep, theta))
+    phases["convert"] = clock() - start
+    start = clock()
+    graph, labels = graphfile.loadGraph(path)
+    phases["load"] = clock() - start
+    seeds, iterations = timeSeeds(module.iterPMIAGraph(graph, labels, k, theta), phases)
+    return phases, seeds, iterations
+
+RUNNERS = {
+    "pgraph": runPgraph,
+    "networkx": runNetworkx,
+    "pool": lambda case, k, theta, tmpdir: runNetworkx(case, k, theta, tmpdir, processes=2),
+    "mapped": runMapped,
+    "bfs": lambda case, k, theta, tmpdir: runNetworkx(case, k, theta, tmpdir, order="bfs"),
+    "rcm": lambda case, k, theta, tmpdir: runNetworkx(case, k, theta, tmpdir, order="rcm"),
+    "degree": lambda case, k, theta, tmpdir: runNetworkx(case, k, theta, tmpdir, order="degree"),
+}
+
+def runCase(case, engines, k, theta):
+    records = []
+    reference = None
+    for engine in engines:
+        record = {"graph": case["graph"], "size": case["size"], "n": case["n"], "m": case["m"],
+                  "model": case["model"], "engine": engine, "k": k, "theta": theta}
+        tmpdir = tempfile.mkdtemp()
+        try:
+            with quiet():
+                phases, seeds, iterations = RUNNERS[engine](case, k, theta, tmpdir)
+        except (ImportError, SyntaxError) as e:
+            record["skipped"] = "%s: %s" % (type(e).__name__, e)
+            records.append(record)
+            continue
+        finally:
+            shutil.rmtree(tmpdir)
+        record.update(phases=phases, per_iteration=iterations, seeds=seeds)
+        if reference is None and engine in EXACT:
+            reference = seeds
+        records.append(record)
+    for record in records:
+        if "seeds" not in record or reference is None:
+            continue
+        if record["engine"] in EXACT:
+            record["agree"] = record["seeds"] == reference
+        else:
+            record["agree"] = record["seeds"] == reference[:len(record["seeds"])]
+    return records
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deterministic PMIA benchmark")
+    parser.add_argument("--sizes", default="500,2000")
+    parser.add_argument("--graphs", default=",".join(GRAPHS))
+    parser.add_argument("--models", default=",".join(MODELS))
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("-k", type=int, default=20)
+    parser.add_argument("--theta", type=float, default=1/80)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench.json")
+    args = parser.parse_args(argv)
+    engines = args.engines.split(",")
+    for engine in engines:
+        if engine not in RUNNERS:
+            parser.error("unknown engine %r" % engine)
+
+    records = []
+    for graph in args.graphs.split(","):
+        for size in [int(s) for s in args.sizes.split(",")]:
+            for model in args.models.split(","):
+                case = makeCase(graph, size, model, args.seed, args.theta)
+                for record in runCase(case, engines, args.k, args.theta):
+                    records.append(record)
+                    if "skipped" in record:
+                        status = "skipped"
+                    else:
+                        status = "%.3fs" % sum(record["phases"].values())
+                        if record.get("agree") is False:
+                            status += " DISAGREES"
+                    print("%-8s n=%-6s m=%-7s %-10s %-8s %s" % (graph, case["n"], case["m"], model, record["engine"], status))
+
+    with open(args.output, "w") as f:
+        json.dump({"python": sys.version.split()[0],
+                   "config": {"sizes": args.sizes, "graphs": args.graphs, "models": args.models,
+                              "engines": args.engines, "k": args.k, "theta": args.theta, "seed": args.seed},
+                   "records": records}, f, indent=1, sort_keys=True)
+    failed = [r for r in records if r["engine"] in EXACT and r.get("agree") is False]
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
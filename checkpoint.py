@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+''' Checkpoints of the PMIA greedy state.
+
+A checkpoint is two files. <path>.base holds a full state: every PMIIA
+tree as flat arrays (root, node ids, parent indices, Ep to parent) with
+its ap, alpha and seed positions, the IS sets, IncInf and the seeds chosen
+so far. It is first written right after the initial forest is built.
+<path>.log gets one record per greedy iteration: the seed, the trees that
+iteration rebuilt with their ap, alpha and seed positions, the IS sets it
+may have changed and the IncInf values it touched. An iteration's record
+is about the size of what the iteration computed, so checkpointing costs
+a fraction of the iteration itself. Rebuilt trees are stored again in
+every record, so once the log grows bigger than the base the current
+state is written as a new base and the log starts over; that keeps the
+files within twice the size of the state and the cost of compacting
+within that of the records written since the last base.
+restore() loads the base and replays the log. A record cut short by a
+crash is dropped (and truncated away, so later records aren't lost after
+it); the run then resumes after the last complete iteration.
+Each base gets a random generation id and its log starts with that id.
+A new base is renamed into place before its empty log replaces the old
+one, so a crash in between leaves the log of another base next to it.
+A base is only written when it holds everything in the current log (or
+for a fresh run, which drops it), so read() ignores a log with another
+generation, as well as a missing one, and starts an empty log instead.
+
+Records are a JSON header followed by raw arrays in native byte order.
+'''
+
+import os, json, struct, zlib, binascii
+from array import array
+from arborescence import Arborescence
+
+MAGIC = b'PMIACKPT'
+VERSION = 3
+
+def _writeRecord(f, meta, sections):
+    layout = [(name, data.typecode, len(data)) for name, data in sections]
+    header = json.dumps({"meta": meta, "sections": layout}).encode("utf-8")
+    size = 8 + len(header) + sum(len(data)*data.itemsize for _, data in sections)
+    f.write(struct.pack("=QQ", size, len(header)))
+    f.write(header)
+    for _, data in sections:
+        data.tofile(f)
+
+def _readRecord(f, end):
+    ''' Read the record at f's position; None at the end of the file or for
+    a record cut short.
+    '''
+    if end - f.tell() < 16:
+        return None
+    size, header_size = struct.unpack("=QQ", f.read(16))
+    if end - f.tell() < size - 8:
+        return None
+    header = json.loads(f.read(header_size).decode("utf-8"))
+    sections = dict()
+    for name, typecode, count in header["sections"]:
+        data = array(str(typecode))
+        data.fromfile(f, count)
+        sections[name] = data
+    return header["meta"], sections
+
+def _packTrees(roots, PMIIA, ap, alpha):
+    offsets = array('l', [0])
+    nodes, parents = array('i'), array('i')
+    weights, aps, alphas = array('d'), array('d'), array('d')
+    for v in roots:
+        tree = PMIIA[v]
+        nodes.extend(tree.nodes)
+        parents.extend(tree.parent)
+        weights.extend(tree.weight)
+        aps.extend(ap[v])
+        alphas.extend(alpha[v])
+        offsets.append(len(nodes))
+    return [("roots", array('i', roots)), ("tree_offsets", offsets), ("nodes", nodes),
+            ("parents", parents), ("weights", weights), ("ap", aps), ("alpha", alphas)]
+
+def _unpackTrees(sections, PMIIA, ap, alpha):
+    offsets = sections["tree_offsets"]
+    for i, v in enumerate(sections["roots"]):
+        a, b = offsets[i], offsets[i+1]
+        PMIIA[v] = Arborescence(sections["nodes"][a:b], sections["parents"][a:b], sections["weights"][a:b])
+        ap[v] = sections["ap"][a:b]
+        alpha[v] = sections["alpha"][a:b]
+
+def _packGroups(name, keys, groups):
+    ''' keys and, for each key, the ints in groups[key] as offsets + values. '''
+    offsets = array('l', [0])
+    values = array('i')
+    for v in keys:
+        values.extend(groups[v])
+        offsets.append(len(values))
+    return [(name + "_keys", array('i', keys)), (name + "_offsets", offsets), (name, values)]
+
+def _unpackGroups(name, sections):
+    offsets = sections[name + "_offsets"]
+    values = sections[name]
+    for i, v in enumerate(sections[name + "_keys"]):
+        yield v, values[offsets[i]:offsets[i+1]]
+
+class Checkpoint(object):
+    def __init__(self, path):
+        self.base = path + ".base"
+        self.log = path + ".log"
+        # what the next base is written with: set by saveBase() and restore()
+        self.meta = None
+        self.roots = None
+        self.seeds = [] # (seed, elapsed) of the iterations in the checkpoint
+
+    def exists(self):
+        return os.path.exists(self.base)
+
+    def writeBase(self, meta, sections):
+        ''' Replace the checkpoint with a new base and an empty log. '''
+        generation = binascii.hexlify(os.urandom(8)).decode("ascii")
+        tmp = self.base + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            _writeRecord(f, dict(meta, version=VERSION, seeds=self.seeds, generation=generation), sections)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, self.base)
+        self.__startLog(generation)
+
+    def __startLog(self, generation):
+        ''' Replace the log with an empty one for the base of generation. '''
+        tmp = self.log + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(binascii.unhexlify(generation))
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, self.log)
+
+    def append(self, meta, sections):
+        if not self.exists():
+            raise Exception("%s is missing; write the checkpoint base before its log" % self.base)
+        with open(self.log, "ab") as f:
+            _writeRecord(f, meta, sections)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def outgrown(self):
+        ''' Whether the log has grown bigger than the base. '''
+        return os.path.getsize(self.log) > os.path.getsize(self.base)
+
+    def read(self):
+        ''' Return the base record and the list of complete log records. '''
+        with open(self.base, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise Exception("%s is not a PMIA checkpoint" % self.base)
+            base = _readRecord(f, os.fstat(f.fileno()).st_size)
+        if base is None or base[0].get("version") != VERSION:
+            raise Exception("%s is incomplete or of another version" % self.base)
+        generation = base[0]["generation"]
+        if not os.path.exists(self.log):
+            self.__startLog(generation)
+            return base, []
+        records = []
+        with open(self.log, "r+b") as f:
+            end = os.fstat(f.fileno()).st_size
+            if f.read(len(MAGIC)) != MAGIC:
+                raise Exception("%s is not a PMIA checkpoint log" % self.log)
+            current = binascii.hexlify(f.read(8)).decode("ascii") == generation
+            while current:
+                good = f.tell()
+                record = _readRecord(f, end)
+                if record is None:
+                    break
+                records.append(record)
+            if current and good < end:
+                f.truncate(good) # drop a record cut short by a crash
+        if not current:
+            # the log of the base this one replaced: the run crashed before
+            # starting the new log, and the new base holds all of it
+            self.__startLog(generation)
+        return base, records
+
+def stateMeta(graph, labels, theta, drop_isolated):
+    ''' What a checkpoint must have been written with to be resumed: the
+    same graph (content hashes of its structure and of the Ep column, and a
+    labels checksum), theta and drop_isolated.
+    '''
+    return {"vertices": graph.vcount(), "edges": graph.ecount(), "theta": theta,
+            "graph": graph.digest(()), "ep": graph.digest([0]),
+            "drop_isolated": bool(drop_isolated),
+            "labels": zlib.crc32(json.dumps(list(labels)).encode("utf-8")) & 0xffffffff}
+
+def _packTreeSeeds(keys, treeSeeds):
+    seeds = dict((v, sorted(treeSeeds[v])) for v in keys)
+    return (_packGroups("tree_seeds", keys, seeds) +
+            _packGroups("tree_seed_index", keys, dict((v, [treeSeeds[v][s] for s in seeds[v]]) for v in keys)))
+
+def _unpackTreeSeeds(sections, treeSeeds):
+    index = dict(_unpackGroups("tree_seed_index", sections))
+    for v, s in _unpackGroups("tree_seeds", sections):
+        treeSeeds[v] = dict(zip(s, index[v]))
+
+def saveBase(ckpt, meta, roots, PMIIA, ap, alpha, IS, treeSeeds, IncInf):
+    ''' Write the whole state as the base: the PMIIA forest of roots with
+    ap, alpha and seed positions, IS, IncInf and ckpt.seeds.
+    '''
+    ckpt.meta, ckpt.roots = meta, list(roots)
+    ids = sorted(IncInf)
+    ckpt.writeBase(meta, _packTrees(ckpt.roots, PMIIA, ap, alpha) +
+                   _packTreeSeeds(ckpt.roots, treeSeeds) + _packGroups("IS", ckpt.roots, IS) +
+                   [("incinf_ids", array('i', ids)), ("incinf", array('d', [IncInf[u] for u in ids]))])
+
+def saveIteration(ckpt, u, elapsed, rebuilt, blocked, PMIIA, ap, alpha, IS, treeSeeds, IncInf, touched):
+    ''' Append the changes of the iteration that picked seed u: the trees of
+    rebuilt with their seed positions, IS of blocked and IncInf of touched.
+    Compacts the checkpoint into a new base once the log outgrows it.
+    '''
+    touched = sorted(touched)
+    ckpt.append({"seed": u, "elapsed": elapsed},
+                _packTrees(rebuilt, PMIIA, ap, alpha) + _packTreeSeeds(rebuilt, treeSeeds) +
+                _packGroups("IS", blocked, IS) +
+                [("incinf_ids", array('i', touched)), ("incinf", array('d', [IncInf[w] for w in touched]))])
+    ckpt.seeds.append((u, elapsed))
+    if ckpt.outgrown():
+        saveBase(ckpt, ckpt.meta, ckpt.roots, PMIIA, ap, alpha, IS, treeSeeds, IncInf)
+
+def restore(ckpt, meta, PMIIA, ap, alpha, IS, treeSeeds, IncInf):
+    ''' Load ckpt into the given dicts and return [(seed, elapsed), ...] of
+    the iterations it holds. meta must match the meta it was written with.
+    '''
+    (base_meta, base), records = ckpt.read()
+    for key, value in meta.items():
+        if base_meta.get(key) != value:
+            raise Exception("checkpoint %s was written with %s=%r, not %r" %(ckpt.base, key, base_meta.get(key), value))
+    _unpackTrees(base, PMIIA, ap, alpha)
+    _unpackTreeSeeds(base, treeSeeds)
+    for v, blocked in _unpackGroups("IS", base):
+        IS[v] = set(blocked)
+    IncInf.clear()
+    IncInf.update(zip(base["incinf_ids"], base["incinf"]))
+    seeds = [(u, elapsed) for u, elapsed in base_meta["seeds"]]
+    for record_meta, sections in records:
+        u = record_meta["seed"]
+        seeds.append((u, record_meta["elapsed"]))
+        IncInf.pop(u)
+        _unpackTrees(sections, PMIIA, ap, alpha)
+        _unpackTreeSeeds(sections, treeSeeds)
+        for v, blocked in _unpackGroups("IS", sections):
+            IS[v] = set(blocked)
+        IncInf.update(zip(sections["incinf_ids"], sections["incinf"]))
+    ckpt.meta, ckpt.roots, ckpt.seeds = meta, list(base["roots"]), list(seeds)
+    return seeds
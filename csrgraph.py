@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+'''
+压缩稀疏行（CSR）图存储
+
+出边按源点连续存放在 targets / values 数组里，offsets[v]:offsets[v+1] 是 v 的出边区间；
+入边另有一份按终点排列的反向索引（CSC），记录源点和对应出边的下标。
+每条边只占几个定长数组元素，出边部分 4 字节终点 + 每个数值列 8 字节，反向索引再加 4 字节源点 + 8 字节出边下标，
+不再为每条边建一个 Python 对象。
+
+add_edge 先把边追加到待压缩缓冲区，第一次读取邻居时统一压缩，之后可以继续加边。
+同一源点的出边按“后加入的先遍历”排列，与原来头插法链表的遍历顺序一致。
+
+save / load 把压缩后的数组原样写进一个二进制文件，load 用 mmap 映射回来，
+不解析也不拷贝，页面按需从文件读入，同时运行的多个进程共用同一份页缓存。
+文件格式：8 字节魔数，8 字节头部长度，JSON 头部（节点数、列类型码、各数组的类型码、位置、长度），
+之后是按 8 字节对齐的各个数组，字节序与写入的机器相同。
+'''
+import sys, json, mmap, struct, ctypes, hashlib
+from array import array
+
+# 节点下标
+ID_TYPECODE = 'i'
+# offsets 数组和边在出边数组里的下标，边数可能超过 2^31
+OFFSET_TYPECODE = 'l'
+
+MAGIC = b'CSRGRAPH'
+FILE_VERSION = 1
+# array 类型码对应的 ctypes 类型，load 时用它直接在 mmap 上建数组
+CTYPES = {'b': ctypes.c_byte, 'B': ctypes.c_ubyte, 'h': ctypes.c_short, 'H': ctypes.c_ushort,
+		'i': ctypes.c_int, 'I': ctypes.c_uint, 'l': ctypes.c_long, 'L': ctypes.c_ulong,
+		'f': ctypes.c_float, 'd': ctypes.c_double}
+
+
+# 按上面的文件格式写出若干数组，sections 是 (名字, 类型码, 数组) 列表，header 里的字段原样写进 JSON 头部
+def write_sections(path, magic, header, sections):
+	layout = []
+	position = 0
+	for name, typecode, data in sections:
+		itemsize = ctypes.sizeof(CTYPES[typecode])
+		layout.append((name, typecode, itemsize, position, len(data)))
+		position += (len(data) * itemsize + 7) // 8 * 8
+	header = json.dumps(dict(header, byteorder=sys.byteorder, sections=layout)).encode('utf-8')
+	start = (len(magic) + 8 + len(header) + 7) // 8 * 8
+	f = open(path, 'wb')
+	try:
+		f.write(magic)
+		f.write(struct.pack('=Q', len(header)))
+		f.write(header)
+		for (_, typecode, data), (_, _, _, offset, _) in zip(sections, layout):
+			f.write(b'\0' * (start + offset - f.tell()))
+			if not isinstance(data, array):
+				data = array(typecode, data) # 从文件映射来的数组
+			data.tofile(f)
+		f.write(b'\0' * (start + position - f.tell()))
+	finally:
+		f.close()
+
+
+# 映射 write_sections 写出的文件，返回 (头部, {名字: 建在映射上的 ctypes 数组}, 映射)
+def map_sections(path, magic):
+	f = open(path, 'rb')
+	try:
+		if f.read(len(magic)) != magic:
+			raise Exception("%s is not a %s file" % (path, magic.decode('ascii')))
+		size, = struct.unpack('=Q', f.read(8))
+		header = json.loads(f.read(size).decode('utf-8'))
+		if header['byteorder'] != sys.byteorder:
+			raise Exception("%s: written on a %s-endian machine" % (path, header['byteorder']))
+		mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+	finally:
+		f.close()
+	start = (len(magic) + 8 + size + 7) // 8 * 8
+	sections = dict()
+	for name, typecode, itemsize, offset, count in header['sections']:
+		ctype = CTYPES[str(typecode)]
+		if ctypes.sizeof(ctype) != itemsize:
+			raise Exception("%s: %s has %d-byte items, expected %d" % (path, name, itemsize, ctypes.sizeof(ctype)))
+		sections[name] = (ctype * count).from_buffer(mapped, start + offset)
+	return header, sections, mapped
+
+
+# 数组的原始字节，array 和映射上的 ctypes 数组都可以
+def raw_bytes(data):
+	if isinstance(data, array):
+		return data.tobytes() if hasattr(data, 'tobytes') else data.tostring()
+	return ctypes.string_at(ctypes.addressof(data), ctypes.sizeof(data))
+
+
+class CSRGraph(object):
+	def __init__(self, columns='d'):
+		# columns 中每个字符是一列边属性的 array 类型码，例如 'd' 表示一个 double 权重
+		self.__columns = columns
+		self.__count = 0
+		# 出边
+		self.__offsets = array(OFFSET_TYPECODE, [0])
+		self.__targets = array(ID_TYPECODE)
+		self.__values = [array(c) for c in columns]
+		# 入边反向索引：in_sources 是源点，in_edges 是这条边在出边数组里的下标
+		self.__in_offsets = array(OFFSET_TYPECODE, [0])
+		self.__in_sources = array(ID_TYPECODE)
+		self.__in_edges = array(OFFSET_TYPECODE)
+		# 尚未压缩的新边
+		self.__pending_src = array(ID_TYPECODE)
+		self.__pending_dst = array(ID_TYPECODE)
+		self.__pending_values = [array(c) for c in columns]
+		# load 得到的图指向文件映射，只读
+		self.__mapped = None
+		# save 时随图写进文件头部的附加信息（可 JSON 序列化），load 时读回
+		self.info = None
+
+	def vcount(self):
+		return self.__count
+
+	def ecount(self):
+		return len(self.__targets) + len(self.__pending_src)
+
+	def add_vertex(self):
+		self.__check_writable()
+		self.__count += 1
+		return self.__count - 1
+
+	def add_vertices(self, n):
+		self.__check_writable()
+		self.__count += n
+
+	def add_edge(self, src, dst, *values):
+		self.__check_writable()
+		if len(values) != len(self.__columns):
+			raise Exception("edge needs %d values, got %d" %(len(self.__columns), len(values)))
+		self.__pending_src.append(src)
+		self.__pending_dst.append(dst)
+		for column, value in zip(self.__pending_values, values):
+			column.append(value)
+
+	'''
+	下面的函数都是切片读取，返回 array
+	'''
+	def out_range(self, v):
+		self.__compress()
+		return self.__offsets[v], self.__offsets[v+1]
+
+	def out_neighbors(self, v):
+		self.__compress()
+		return self.__targets[self.__offsets[v]:self.__offsets[v+1]]
+
+	def out_values(self, v, col=0):
+		self.__compress()
+		return self.__values[col][self.__offsets[v]:self.__offsets[v+1]]
+
+	def in_neighbors(self, v):
+		self.__compress()
+		return self.__in_sources[self.__in_offsets[v]:self.__in_offsets[v+1]]
+
+	# 入边在出边数组里的下标，配合 value() 读取入边权重
+	def in_edges(self, v):
+		self.__compress()
+		return self.__in_edges[self.__in_offsets[v]:self.__in_offsets[v+1]]
+
+	def in_values(self, v, col=0):
+		in_edges = self.in_edges(v)
+		column = self.__values[col]
+		return array(self.__columns[col], [column[e] for e in in_edges])
+
+	def target(self, e):
+		self.__compress()
+		return self.__targets[e]
+
+	def value(self, e, col=0):
+		self.__compress()
+		return self.__values[col][e]
+
+	# 整列边属性，与出边数组对齐，按边下标直接读取；之后再加边会换成新数组
+	def column(self, col=0):
+		self.__compress()
+		return self.__values[col]
+
+	# 返回 src->dst 这条边的下标，不存在返回 -1
+	def find_edge(self, src, dst):
+		start, end = self.out_range(src)
+		try:
+			return start + self.__targets[start:end].index(dst)
+		except ValueError:
+			return -1
+
+	def __check_writable(self):
+		if self.__mapped is not None:
+			raise Exception("graph loaded from a file is read-only")
+
+	# 写进文件的各个数组：(名字, 类型码, 数组)
+	def __sections(self):
+		sections = [('offsets', OFFSET_TYPECODE, self.__offsets), ('targets', ID_TYPECODE, self.__targets)]
+		sections += [('values%d' % i, c, column) for i, (c, column) in enumerate(zip(self.__columns, self.__values))]
+		sections += [('in_offsets', OFFSET_TYPECODE, self.__in_offsets),
+				('in_sources', ID_TYPECODE, self.__in_sources),
+				('in_edges', OFFSET_TYPECODE, self.__in_edges)]
+		return sections
+
+	def save(self, path):
+		self.__compress()
+		write_sections(path, MAGIC, {'version': FILE_VERSION, 'vertices': self.__count,
+				'columns': self.__columns, 'info': self.info}, self.__sections())
+
+	# 映射 save 写出的文件，返回只读的图；数组是建在映射上的 ctypes 数组，切片得到 list
+	@classmethod
+	def load(cls, path):
+		header, sections, mapped = map_sections(path, MAGIC)
+		if header['version'] != FILE_VERSION:
+			raise Exception("%s: unsupported version" % path)
+		graph = cls(str(header['columns']))
+		graph.__count = header['vertices']
+		graph.__offsets = sections['offsets']
+		graph.__targets = sections['targets']
+		graph.__values = [sections['values%d' % i] for i in range(len(graph.__columns))]
+		graph.__in_offsets = sections['in_offsets']
+		graph.__in_sources = sections['in_sources']
+		graph.__in_edges = sections['in_edges']
+		graph.__mapped = mapped
+		graph.info = header.get('info')
+		return graph
+
+	# 图内容的 SHA-1：节点数、出边结构和 columns 里的各列边属性；
+	# 内存里的图和 save 后再 load 的图相同，可以用作按图缓存结果的键
+	def digest(self, columns=None):
+		self.__compress()
+		if columns is None:
+			columns = range(len(self.__columns))
+		h = hashlib.sha1(struct.pack('=q', self.__count))
+		h.update(raw_bytes(self.__offsets))
+		h.update(raw_bytes(self.__targets))
+		for col in columns:
+			h.update(self.__columns[col].encode('ascii'))
+			h.update(raw_bytes(self.__values[col]))
+		return h.hexdigest()
+
+	# 把待压缩的边合并进 CSR，再重建反向索引，O(V+E)
+	def __compress(self):
+		if not self.__pending_src:
+			# 上次压缩后只加了点：新点没有边，区间补成空的
+			grown = self.__count + 1 - len(self.__offsets)
+			if grown > 0:
+				self.__offsets.extend(array(OFFSET_TYPECODE, [self.__offsets[-1]]) * grown)
+				self.__in_offsets.extend(array(OFFSET_TYPECODE, [self.__in_offsets[-1]]) * grown)
+			return
+		n = self.__count
+		old_offsets = self.__offsets
+		old_n = len(old_offsets) - 1
+		degree = array(OFFSET_TYPECODE, [0]) * n
+		for v in range(old_n):
+			degree[v] = old_offsets[v+1] - old_offsets[v]
+		for src in self.__pending_src:
+			degree[src] += 1
+		offsets = array(OFFSET_TYPECODE, [0]) * (n + 1)
+		for v in range(n):
+			offsets[v+1] = offsets[v] + degree[v]
+		m = offsets[n]
+		targets = array(ID_TYPECODE, [0]) * m
+		values = [array(c, [0]) * m for c in self.__columns]
+		fill = offsets[:n]
+		# 新边倒序写在前面
+		for i in range(len(self.__pending_src) - 1, -1, -1):
+			pos = fill[self.__pending_src[i]]
+			targets[pos] = self.__pending_dst[i]
+			for column, pending in zip(values, self.__pending_values):
+				column[pos] = pending[i]
+			fill[self.__pending_src[i]] = pos + 1
+		# 旧边整段接在后面
+		for v in range(old_n):
+			start, end = old_offsets[v], old_offsets[v+1]
+			pos = fill[v]
+			targets[pos:pos+end-start] = self.__targets[start:end]
+			for column, old in zip(values, self.__values):
+				column[pos:pos+end-start] = old[start:end]
+		self.__offsets = offsets
+		self.__targets = targets
+		self.__values = values
+		self.__pending_src = array(ID_TYPECODE)
+		self.__pending_dst = array(ID_TYPECODE)
+		self.__pending_values = [array(c) for c in self.__columns]
+		self.__build_reverse_index()
+
+	# 按终点做计数排序，同一终点的入边按源点 id 从小到大排列
+	def __build_reverse_index(self):
+		n = self.__count
+		m = len(self.__targets)
+		in_offsets = array(OFFSET_TYPECODE, [0]) * (n + 1)
+		for dst in self.__targets:
+			in_offsets[dst+1] += 1
+		for v in range(n):
+			in_offsets[v+1] += in_offsets[v]
+		in_sources = array(ID_TYPECODE, [0]) * m
+		in_edges = array(OFFSET_TYPECODE, [0]) * m
+		fill = in_offsets[:n]
+		for src in range(n):
+			for e in range(self.__offsets[src], self.__offsets[src+1]):
+				dst = self.__targets[e]
+				pos = fill[dst]
+				in_sources[pos] = src
+				in_edges[pos] = e
+				fill[dst] = pos + 1
+		self.__in_offsets = in_offsets
+		self.__in_sources = in_sources
+		self.__in_edges = in_edges
@@ -1,58 +1,45 @@
 '''
 物理层链路图
 '''
+from csrgraph import CSRGraph
+
 # 节点类
 class Pvertex:
 	def __init__(self, vertex_id, vertex_capacity):
 		self.vertex_id = vertex_id
 		self.vertex_capacity = vertex_capacity
-		self.listpointer = None
 		self.reached = False
 		# 以下变量用于 Dijkstra 算法，外部不可访问，仅用于算法计算
 		self.__visited = None
 		self.__distance = None
 
-# 邻接表节点类
-class Padjlist_node:
-	def __init__(self, dst_vertex_id, edge_weight, edge_capacity):
-		self.dst_vertex_id = dst_vertex_id
-		self.edge_weight = edge_weight
-		self.edge_capacity = edge_capacity
-		self.next = None
-
 # 物理通信图类
 class Pgraph:
 	def __init__(self):
 		self.adjlist = [] # array of pvertex
+		self.edges = CSRGraph('dd') # 每条边两列：权重、容量
 		# 以下变量用于 Dijkstra 算法，外部不可访问，仅用于算法计算
 		self.__unvisited_count = None
 
 	def add_vertex(self, vertex_capacity):
 		v = Pvertex(len(self.adjlist), vertex_capacity)
 		self.adjlist.append(v)
+		self.edges.add_vertex()
 
 	def add_edge(self, src_vertex, dst_vertex_id, edge_weight, edge_capacity):
 		# 检测节点合法性
 		self.__valid_vertex(src_vertex)
 		self.__valid_vertex(dst_vertex_id)
 		# 从 src 到 dst
-		p = self.adjlist[src_vertex].listpointer
-		node = Padjlist_node(dst_vertex_id, edge_weight, edge_capacity)
-		node.next = p
-		self.adjlist[src_vertex].listpointer = node
+		self.edges.add_edge(src_vertex, dst_vertex_id, edge_weight, edge_capacity)
 		# 从 dst 到 src
-		p = self.adjlist[dst_vertex_id].listpointer
-		node = Padjlist_node(src_vertex, edge_weight, edge_capacity)
-		node.next = p
-		self.adjlist[dst_vertex_id].listpointer = node
+		self.edges.add_edge(dst_vertex_id, src_vertex, edge_weight, edge_capacity)
 
 	def dump(self):
 		for vertex in self.adjlist:
 			print(str(vertex.vertex_id) + " :", end='')
-			p = vertex.listpointer
-			while p:
-				print(" " + str(p.dst_vertex_id), end='')
-				p = p.next
+			for dst in self.edges.out_neighbors(vertex.vertex_id):
+				print(" " + str(dst), end='')
 			print()
 
 	def __valid_vertex(self, vertex):
@@ -87,14 +74,13 @@ class Pgraph:
 		while self.__unvisited_count != 0:
 			min_distance_vertex = self.find_min_distance_vertex()
 			# 如果 min_distance_vertex 是 None，则存在孤立节点，当前暂不考虑这种情况
-			p = min_distance_vertex.listpointer
-			while p:
-				p_distance = self.adjlist[p.dst_vertex_id].__distance
-				sum_distance = min_distance_vertex.__distance + p.edge_weight
+			vid = min_distance_vertex.vertex_id
+			for dst, edge_weight in zip(self.edges.out_neighbors(vid), self.edges.out_values(vid)):
+				p_distance = self.adjlist[dst].__distance
+				sum_distance = min_distance_vertex.__distance + edge_weight
 				if sum_distance < p_distance:
-					self.adjlist[p.dst_vertex_id].__distance = sum_distance
-					prev[p.dst_vertex_id] = min_distance_vertex.vertex_id
-				p = p.next
+					self.adjlist[dst].__distance = sum_distance
+					prev[dst] = vid
 			min_distance_vertex.__visited = True
 			self.__unvisited_count -= 1
 		path = [to_vertex]
@@ -114,14 +100,6 @@ class Pgraph:
 class Svertex:
 	def __init__(self, vertex_id):
 		self.vertex_id = vertex_id
-		self.listpointer = None
-
-# 邻接表节点类
-class Sadjlist_node:
-	def __init__(self, dst_vertex_id, edge_probability):
-		self.dst_vertex_id = dst_vertex_id
-		self.edge_probability = edge_probability
-		self.next = None
 
 # 社会关系图类
 class Sgraph:
@@ -130,41 +108,30 @@ class Sgraph:
 	'''
 	def __init__(self):
 		self.adjlist = [] # array of svertex
+		self.edges = CSRGraph('d') # 边上记录关系概率
 
 	def add_vertex(self):
 		v = Svertex(len(self.adjlist))
 		self.adjlist.append(v)
+		self.edges.add_vertex()
 
 	def add_edge(self, src_vertex, dst_vertex_id, edge_probability):
 		# 检测节点合法性
 		self.__valid_vertex(src_vertex)
 		self.__valid_vertex(dst_vertex_id)
 		# 从 src 到 dst
-		p = self.adjlist[src_vertex].listpointer
-		node = Sadjlist_node(dst_vertex_id, edge_probability)
-		node.next = p
-		self.adjlist[src_vertex].listpointer = node
+		self.edges.add_edge(src_vertex, dst_vertex_id, edge_probability)
 		# 从 dst 到 src
-		p = self.adjlist[dst_vertex_id].listpointer
-		node = Sadjlist_node(src_vertex, edge_probability)
-		node.next = p
-		self.adjlist[dst_vertex_id].listpointer = node
+		self.edges.add_edge(dst_vertex_id, src_vertex, edge_probability)
 
 	def get_social_adj_vertex(self, vertex_id):
-		adjlist_node = self.adjlist[vertex_id].listpointer
-		adj_vertex_list = []
-		while adjlist_node:
-			adj_vertex_list.append(adjlist_node.dst_vertex_id)
-			adjlist_node = adjlist_node.next
-		return adj_vertex_list
+		return list(self.edges.out_neighbors(vertex_id))
 
 	def dump(self):
 		for vertex in self.adjlist:
 			print(str(vertex.vertex_id) + " :", end='')
-			p = vertex.listpointer
-			while p:
-				print(" " + str(p.dst_vertex_id), end='')
-				p = p.next
+			for dst in self.edges.out_neighbors(vertex.vertex_id):
+				print(" " + str(dst), end='')
 			print()
 
 	def __valid_vertex(self, vertex):
@@ -220,16 +187,13 @@ if __name__ == '__main__':
 	inf = dict() # start vertex id : number of influenced vertex
 	for v in pgraph.adjlist:
 		s = v.vertex_id
-		p = sgraph.adjlist[s].listpointer
-		while p:
-			d = p.dst_vertex_id
+		for d in sgraph.get_social_adj_vertex(s):
 			path = pgraph.shortest_path(s, d)
 			nums = 0 # influence
 			for path_vertex_id in path:
 				adj_vertex_list = sgraph.get_social_adj_vertex(path_vertex_id)
 				nums += len(set(adj_vertex_list))
 			inf[s] = nums
-			p = p.next
 
 	max_influence = 0
 	seed_vertex = None
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+''' Persisted initial PMIIA forest.
+
+Before the first seed is chosen the PMIIA forest, its ap/alpha arrays and
+IncInf depend only on the graph, Ep and theta, so a run can start from a
+saved copy instead of building them again. An index file holds, for every
+node v, PMIIA(v) for the empty seed set as flat arrays (node ids, parent
+indices, Ep to parent) with its alpha (ap is all zeros), followed by the
+initial IncInf. It is written in csrgraph's section format and mapped
+back: a tree is only copied out of the file when the greedy loop first
+touches it, so opening an index costs O(n) however large the forest is.
+
+Index files are named after a content hash of the graph (structure and
+labels), one of Ep, and theta, so an index is only ever used for the
+inputs it was built from. Nodes left isolated by pruning get their
+one-node tree too, which makes an index usable with and without
+drop_isolated.
+'''
+
+import os, json, hashlib
+from array import array
+from arborescence import Arborescence
+from csrgraph import ID_TYPECODE, OFFSET_TYPECODE, write_sections, map_sections
+
+MAGIC = b'PMIAFRST'
+VERSION = 1
+
+def indexKey(graph, labels, theta):
+    ''' (graph hash, Ep hash, theta) of a graph packed by buildGraph() or
+    mapped by graphfile.loadGraph().
+    '''
+    h = hashlib.sha1(graph.digest(()).encode("ascii"))
+    h.update(json.dumps(list(labels)).encode("utf-8"))
+    return h.hexdigest(), graph.digest([0]), theta
+
+def indexPath(directory, key):
+    graph_hash, ep_hash, theta = key
+    return os.path.join(directory, "pmiia-%s-%s-%r.idx" %(graph_hash[:16], ep_hash[:16], theta))
+
+def writeIndex(path, key, n, PMIIA, alpha, IncInf):
+    ''' Write the initial forest of nodes 0..n-1. Nodes without a tree in
+    PMIIA (isolated ones under drop_isolated) get their one-node tree.
+    The file is written under a temporary name and renamed, so concurrent
+    jobs never map half an index.
+    '''
+    offsets = array(OFFSET_TYPECODE, [0])
+    nodes, parents = array(ID_TYPECODE), array(ID_TYPECODE)
+    weights, alphas = array('d'), array('d')
+    for v in range(n):
+        if v in PMIIA:
+            tree = PMIIA[v]
+            nodes.extend(tree.nodes)
+            parents.extend(tree.parent)
+            weights.extend(tree.weight)
+            alphas.extend(alpha[v])
+        else:
+            nodes.append(v)
+            parents.append(-1)
+            weights.append(0)
+            alphas.append(1)
+        offsets.append(len(nodes))
+    graph_hash, ep_hash, theta = key
+    tmp = "%s.%d.tmp" %(path, os.getpid())
+    write_sections(tmp, MAGIC, {"version": VERSION, "graph": graph_hash, "ep": ep_hash,
+                                "theta": theta, "vertices": n},
+                   [("tree_offsets", OFFSET_TYPECODE, offsets), ("nodes", ID_TYPECODE, nodes),
+                    ("parents", ID_TYPECODE, parents), ("weights", 'd', weights),
+                    ("alpha", 'd', alphas), ("incinf", 'd', array('d', [IncInf[v] for v in range(n)]))])
+    os.rename(tmp, path)
+
+class _Lazy(dict):
+    ''' A dict that fills a missing key from load(key) on first access. '''
+    def __init__(self, load):
+        dict.__init__(self)
+        self.load = load
+
+    def __missing__(self, v):
+        value = self[v] = self.load(v)
+        return value
+
+class ForestIndex(object):
+    def __init__(self, path, key=None):
+        self.path = path
+        header, sections, self.mapped = map_sections(path, MAGIC)
+        if header["version"] != VERSION:
+            raise Exception("%s: unsupported version" % path)
+        if key is not None and [header["graph"], header["ep"], header["theta"]] != list(key):
+            raise Exception("%s was built for another graph, Ep or theta" % path)
+        self.n = header["vertices"]
+        self.offsets = sections["tree_offsets"]
+        self.nodes = sections["nodes"]
+        self.parents = sections["parents"]
+        self.weights = sections["weights"]
+        self.alphas = sections["alpha"]
+        self.incinf = sections["incinf"]
+
+    def tree(self, v):
+        a, b = self.offsets[v], self.offsets[v+1]
+        return Arborescence(self.nodes[a:b], self.parents[a:b], self.weights[a:b])
+
+    def ap(self, v):
+        return array('d', [0])*(self.offsets[v+1] - self.offsets[v])
+
+    def alpha(self, v):
+        return array('d', self.alphas[self.offsets[v]:self.offsets[v+1]])
+
+    def entry(self, v):
+        return self.tree(v), self.ap(v), self.alpha(v)
+
+    def initialIncInf(self):
+        return dict(enumerate(self.incinf))
+
+    def forest(self):
+        ''' (PMIIA, ap, alpha, IncInf) dicts for the greedy loop; trees and
+        their arrays are read from the file when first looked up.
+        '''
+        return _Lazy(self.tree), _Lazy(self.ap), _Lazy(self.alpha), self.initialIncInf()
+
+def openIndex(directory, graph, labels, theta):
+    ''' The index in directory for graph, labels and theta, or None. '''
+    key = indexKey(graph, labels, theta)
+    path = indexPath(directory, key)
+    if not os.path.exists(path):
+        return None
+    return ForestIndex(path, key)
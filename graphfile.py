@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+''' Binary graph files for the PMIA scripts.
+
+convert() reads an adjlist.txt / ep.txt pair (the formats the scripts read
+with nx.read_adjlist and the Ep loop) straight into a CSRGraph with the two
+edge columns buildGraph() makes, Ep and -log(Ep). writeGraph() saves it with
+CSRGraph.save and the node labels next to it in <path>.labels.
+loadGraph() maps both back: the edge arrays stay in the file and are paged
+in on use, so loading takes milliseconds and concurrent runs on the same
+file share one copy in the page cache. cachedGraph() does the conversion
+only when the binary file is missing or was converted from other text
+files: the size and mtime of adjlist.txt and ep.txt, and theta, are kept
+in the file's header. Both files are written under temporary names and
+renamed into place, so a job never maps a file another job is still
+writing.
+
+Run once per dataset:
+    python graphfile.py adjlist.txt ep.txt graph.csr [theta [order]]
+where order is one of reorder.METHODS and renumbers the nodes for locality
+before the file is written.
+'''
+
+from __future__ import division, print_function
+import os, sys, math, zlib
+from array import array
+from csrgraph import CSRGraph, raw_bytes
+from nameindex import NameIndex
+from reorder import reorderGraph
+
+LABEL_TYPECODE = 'l'
+# loads retried when the labels read belong to a graph renamed in meanwhile
+LOAD_ATTEMPTS = 3
+
+def readLabels(adjlist):
+    ''' Sorted list of the integer node labels in an adjlist file. '''
+    labels = set()
+    with open(adjlist) as f:
+        for line in f:
+            labels.update(int(u) for u in line.split('#')[0].split())
+    return sorted(labels)
+
+def convert(adjlist, ep, theta=0):
+    ''' Read the graph in adjlist and its edge probabilities in ep (one
+    "u v p" line per edge) into a CSRGraph with columns Ep and -log(Ep).
+    Node ids are positions in sorted label order, as in buildGraph().
+    Edges with Ep <= theta are dropped; the default only drops Ep = 0.
+    Returns the graph and the list of labels indexed by id.
+    '''
+    index = NameIndex(readLabels(adjlist))
+    n = len(index)
+    # edges of the adjlist as u*n + v, each mapped to whether ep.txt has
+    # given its probability yet, to check that it covers each of them once
+    # in O(1) per line
+    edges = dict()
+    with open(adjlist) as f:
+        for line in f:
+            data = [index.id(int(u)) for u in line.split('#')[0].split()]
+            for v in data[1:]:
+                edges[data[0]*n + v] = False
+    graph = CSRGraph('dd')
+    graph.add_vertices(n)
+    matched = 0
+    with open(ep) as f:
+        for line in f:
+            data = line.split()
+            u, v, p = index.get(int(data[0])), index.get(int(data[1])), float(data[2])
+            if u < 0 or v < 0 or u*n + v not in edges:
+                continue # not an edge of the graph, the networkx scripts ignore it too
+            if edges[u*n + v]:
+                raise Exception("%s lists edge (%s, %s) more than once" %(ep, data[0], data[1]))
+            edges[u*n + v] = True
+            matched += 1
+            if p > theta:
+                graph.add_edge(u, v, p, -math.log(p))
+    m = len(edges)
+    if matched != m:
+        missing = next(key for key, seen in edges.items() if not seen)
+        raise Exception("%s has no probability for %s of the %s edges of %s, e.g. (%s, %s)" %(
+            ep, m - matched, m, adjlist, index.name(missing//n), index.name(missing % n)))
+    print('Pruned %s of %s edges with Ep <= %s, %s edges left' %(m - graph.ecount(), m, theta, graph.ecount()))
+    graph.info = sourceInfo(adjlist, ep, theta)
+    return graph, index.names()
+
+def sourceInfo(adjlist, ep, theta):
+    ''' What convert() records about its input: the text files' sizes and
+    mtimes, and theta.
+    '''
+    return {"adjlist": [os.path.getsize(adjlist), os.path.getmtime(adjlist)],
+            "ep": [os.path.getsize(ep), os.path.getmtime(ep)], "theta": theta}
+
+def _labelsChecksum(labels):
+    return zlib.crc32(raw_bytes(labels)) & 0xffffffff
+
+def writeGraph(path, graph, labels):
+    ''' Save graph and labels under temporary names and rename them into
+    place, labels first. The graph's header keeps a checksum of its labels,
+    so loadGraph() notices labels renamed in after it mapped an older graph.
+    '''
+    labels = array(LABEL_TYPECODE, labels)
+    tmp = "%s.%d.tmp" %(path, os.getpid())
+    with open(tmp + ".labels", "wb") as f:
+        labels.tofile(f)
+    info = graph.info
+    graph.info = dict(info or {}, labels=_labelsChecksum(labels))
+    try:
+        graph.save(tmp)
+    finally:
+        graph.info = info
+    os.rename(tmp + ".labels", path + ".labels")
+    os.rename(tmp, path)
+
+def loadGraph(path):
+    ''' Map a graph written by writeGraph(); returns (graph, labels). '''
+    for _ in range(LOAD_ATTEMPTS):
+        graph = CSRGraph.load(path)
+        labels = array(LABEL_TYPECODE)
+        with open(path + ".labels", "rb") as f:
+            try:
+                labels.fromfile(f, graph.vcount())
+            except EOFError:
+                continue # labels of a smaller graph
+        expected = (graph.info or {}).get("labels")
+        if expected is None or expected == _labelsChecksum(labels):
+            return graph, labels
+    raise Exception("%s.labels doesn't belong to %s" %(path, path))
+
+def cachedGraph(adjlist, ep, path, theta=0):
+    ''' loadGraph(path), converting adjlist and ep into path first if it is
+    missing or was converted from other versions of them or another theta.
+    '''
+    if os.path.exists(path):
+        graph, labels = loadGraph(path)
+        info = graph.info or {}
+        if all(info.get(key) == value for key, value in sourceInfo(adjlist, ep, theta).items()):
+            return graph, labels
+        print('%s is out of date, converting %s and %s again' %(path, adjlist, ep))
+    writeGraph(path, *convert(adjlist, ep, theta))
+    return loadGraph(path)
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (4, 5, 6):
+        print('Usage: python graphfile.py adjlist.txt ep.txt graph.csr [theta [order]]')
+        sys.exit(1)
+    theta = float(sys.argv[4]) if len(sys.argv) > 4 else 0
+    graph, labels = convert(sys.argv[1], sys.argv[2], theta)
+    if len(sys.argv) > 5:
+        info = graph.info
+        graph, labels = reorderGraph(graph, labels, sys.argv[5])
+        graph.info = info
+    writeGraph(sys.argv[3], graph, labels)
+    print('Wrote %s nodes and %s edges to %s' %(graph.vcount(), graph.ecount(), sys.argv[3]))
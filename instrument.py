@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+''' Opt-in phase timing and counters for PMIA runs.
+
+A Profile accumulates, per named phase, the number of calls and the wall
+and CPU seconds spent inside `with profile.phase(name):` blocks (phases
+may nest; each one counts its own time). count() adds to integer counters,
+observe() keeps count/sum/max of a value such as a tree size, and
+iteration() records one row per greedy iteration. The whole trace is
+written with write_json() or write_csv(), together with the peak RSS of
+the process.
+
+NO_PROFILE is the default everywhere: its methods do nothing and its
+phase() returns one shared no-op context manager, so an unprofiled run
+pays a method call per phase and nothing per edge.
+'''
+
+from __future__ import division
+import csv, json, time
+
+try:
+    import resource
+except ImportError: # not on Windows
+    resource = None
+
+wall_clock = getattr(time, "perf_counter", time.time)
+try:
+    cpu_clock = time.process_time
+except AttributeError: # Python 2: time.clock is processor time on Unix
+    cpu_clock = time.clock
+
+def peakRSS():
+    ''' Peak resident set size of this process in KB, or None. '''
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class _Phase(object):
+    __slots__ = ("totals", "wall", "cpu")
+
+    def __init__(self, totals):
+        self.totals = totals
+
+    def __enter__(self):
+        self.wall = wall_clock()
+        self.cpu = cpu_clock()
+
+    def __exit__(self, *exc):
+        totals = self.totals
+        totals[0] += 1
+        totals[1] += wall_clock() - self.wall
+        totals[2] += cpu_clock() - self.cpu
+
+class _NullPhase(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+class NullProfile(object):
+    ''' A profile that records nothing. '''
+    enabled = False
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def count(self, name, n=1):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+    def iteration(self, **fields):
+        pass
+
+NO_PROFILE = NullProfile()
+
+class Profile(object):
+    enabled = True
+
+    def __init__(self):
+        self.phases = dict() # name to [calls, wall, cpu]
+        self.counters = dict()
+        self.stats = dict() # name to [count, sum, max]
+        self.iterations = []
+        self.start_wall = wall_clock()
+        self.start_cpu = cpu_clock()
+
+    def phase(self, name):
+        totals = self.phases.get(name)
+        if totals is None:
+            totals = self.phases[name] = [0, 0.0, 0.0]
+        return _Phase(totals)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        stat = self.stats.get(name)
+        if stat is None:
+            self.stats[name] = [1, value, value]
+        else:
+            stat[0] += 1
+            stat[1] += value
+            stat[2] = max(stat[2], value)
+
+    def iteration(self, **fields):
+        ''' Record one greedy iteration; wall and CPU seconds since the
+        profile was created and the peak RSS so far are added to fields.
+        '''
+        fields.update(wall=wall_clock() - self.start_wall,
+                      cpu=cpu_clock() - self.start_cpu, peak_rss_kb=peakRSS())
+        self.iterations.append(fields)
+
+    def summary(self):
+        return {"phases": dict((name, {"calls": c, "wall": w, "cpu": p})
+                               for name, (c, w, p) in self.phases.items()),
+                "counters": dict(self.counters),
+                "stats": dict((name, {"count": c, "sum": s, "max": m, "mean": s/c})
+                              for name, (c, s, m) in self.stats.items()),
+                "iterations": self.iterations,
+                "wall": wall_clock() - self.start_wall,
+                "cpu": cpu_clock() - self.start_cpu,
+                "peak_rss_kb": peakRSS()}
+
+    def write_json(self, path, **meta):
+        ''' Write summary() plus the given metadata (dataset, theta, ...). '''
+        trace = self.summary()
+        trace["meta"] = meta
+        with open(path, "w") as f:
+            json.dump(trace, f, indent=1, sort_keys=True)
+
+    def write_csv(self, path):
+        ''' One row per phase, counter, stat and iteration. '''
+        trace = self.summary()
+        with open(path, "w") as f:
+            writer = csv.writer(f)
+            writer.writerow(["section", "name", "count", "wall", "cpu", "value", "max"])
+            for name, p in sorted(trace["phases"].items()):
+                writer.writerow(["phase", name, p["calls"], p["wall"], p["cpu"], "", ""])
+            for name, value in sorted(trace["counters"].items()):
+                writer.writerow(["counter", name, "", "", "", value, ""])
+            for name, s in sorted(trace["stats"].items()):
+                writer.writerow(["stat", name, s["count"], "", "", s["sum"], s["max"]])
+            for i, it in enumerate(trace["iterations"]):
+                writer.writerow(["iteration", i, "", it["wall"], it["cpu"], it.get("seed", ""), it["peak_rss_kb"]])
+            writer.writerow(["total", "", "", trace["wall"], trace["cpu"], "", trace["peak_rss_kb"]])
+
+    def write(self, path, **meta):
+        ''' write_csv() for a .csv path, write_json() otherwise. '''
+        if path.endswith(".csv"):
+            self.write_csv(path)
+        else:
+            self.write_json(path, **meta)
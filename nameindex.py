@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+'''
+节点名称与下标的映射
+
+外部数据里的节点名称（字符串、整数等任意可哈希对象）在读入时统一换成 0..n-1 的连续下标，
+算法内部只用下标，状态都可以按下标存进数组；输出时再用 names() 这个反查数组把下标换回名称。
+名称到下标是哈希表查找，O(1)，不再用 list.index 做线性查找。
+'''
+
+
+class NameIndex(object):
+	# names 按顺序分配下标，例如传入排好序的名称，下标的大小关系就和名称一致
+	def __init__(self, names=()):
+		self.__ids = dict()
+		self.__names = []
+		for name in names:
+			self.add(name)
+
+	# 返回名称的下标，新名称分配下一个下标
+	def add(self, name):
+		vid = self.__ids.get(name)
+		if vid is None:
+			vid = len(self.__names)
+			self.__ids[name] = vid
+			self.__names.append(name)
+		return vid
+
+	# 名称对应的下标，名称不存在时抛出 KeyError
+	def id(self, name):
+		return self.__ids[name]
+
+	# 名称对应的下标，名称不存在时返回 default
+	def get(self, name, default=-1):
+		return self.__ids.get(name, default)
+
+	def name(self, vid):
+		return self.__names[vid]
+
+	# 下标到名称的反查数组，names()[vid] 就是 vid 的名称
+	def names(self):
+		return self.__names
+
+	def __len__(self):
+		return len(self.__names)
+
+	def __contains__(self, name):
+		return name in self.__ids
+
+	def __iter__(self):
+		return iter(self.__names)
@@ -3,7 +3,11 @@ import networkx as nx
 import matplotlib
 matplotlib.use('WXAgg')
 import matplotlib.pyplot as plt
-import sys
+import sys, os
+# csrgraph.py、nameindex.py 在上一级目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from csrgraph import CSRGraph
+from nameindex import NameIndex
 
 COLOR_WHITE = 0
 COLOR_GREY = 1
@@ -14,7 +18,6 @@ class Vertex:
 	def __init__(self, vertex_id, vertex_name):
 		self.__vertex_id = vertex_id
 		self.__vertex_name = vertex_name
-		self.__listpointer = None
 		self.__dominance = 0
 		self.__color = COLOR_WHITE
 		self.__dominated_timeline = None
@@ -25,14 +28,6 @@ class Vertex:
 	def get_id(self):
 		return self.__vertex_id
 
-	def get_listpointer(self):
-		return self.__listpointer
-
-	def insert_adjnode(self, vid, weight):
-		v = AdjNode(vid, weight)
-		v.set_next(self.__listpointer)
-		self.__listpointer = v
-
 	def acc_dominance(self, duration):
 		self.__dominance += duration
 
@@ -66,34 +61,13 @@ class Vertex:
 				return False
 		return True
 
-# 邻接表节点类
-class AdjNode:
-	def __init__(self, dst_vertex_id, edge_weight):
-		self.__dst_vertex_id = dst_vertex_id
-		self.__edge_weight = edge_weight
-		self.__next = None
-
-	def get_dst_id(self):
-		return self.__dst_vertex_id
-
-	def get_dst_name(self):
-		return self.__dst_vertex_name
-
-	def get_edge_weight(self):
-		return self.__edge_weight
-
-	def get_next(self):
-		return self.__next
-
-	def set_next(self, n):
-		self.__next = n
-
 # 物理通信图类
 class Graph:
 	def __init__(self):
 		self.__adjlist = [] # array of pvertex
+		self.__edges = CSRGraph('ll') # 边权重是 (起始时间, 持续时长)，分两列存
 		self.__count = 0
-		self.__vertex_names = None
+		self.__names = NameIndex() # 节点名称 <---> 节点下标
 		self.__lifetime = 0
 		self.__white_count = 0
 		self.__dominance_set = set()
@@ -110,28 +84,33 @@ class Graph:
 		return [vid for vid in range(self.__count)]
 
 	def add_vertices(self, vertex_names):
-		self.__vertex_names = vertex_names
-		for idx, name in enumerate(vertex_names):
-			v = Vertex(idx, name)
+		for name in vertex_names:
+			if name in self.__names:
+				raise Exception("vertex %s already exists" %name)
+			v = Vertex(self.__names.add(name), name)
 			self.__adjlist.append(v)
+		self.__edges.add_vertices(len(vertex_names))
 
 	def add_edge(self, name1, name2, weight):
-		vid1 = self.__vertex_names.index(name1)
-		vid2 = self.__vertex_names.index(name2)
+		vid1 = self.__names.id(name1)
+		vid2 = self.__names.id(name2)
 		# 检测节点合法性
 		self.__valid_vertex(vid1)
 		self.__valid_vertex(vid2)
-		self.__adjlist[vid1].insert_adjnode(vid2, weight)
-		self.__adjlist[vid2].insert_adjnode(vid1, weight)
+		self.__edges.add_edge(vid1, vid2, weight[0], weight[1])
+		self.__edges.add_edge(vid2, vid1, weight[0], weight[1])
+
+	# 返回 [(邻接点 id, 边权重), ...]
+	def neighbors(self, vid):
+		return list(zip(self.__edges.out_neighbors(vid),
+				zip(self.__edges.out_values(vid, 0), self.__edges.out_values(vid, 1))))
 
 	def dump_graph(self):
 		print("Adjacent list of Graph:")
 		for vobj in self.__adjlist:
 			print("%s:" %vobj.get_name(), end='')
-			p = vobj.get_listpointer()
-			while p:
-				print(" %s" %self.get_name_by_id(p.get_dst_id()), end='')
-				p = p.get_next()
+			for dst, _ in self.neighbors(vobj.get_id()):
+				print(" %s" %self.get_name_by_id(dst), end='')
 			print()
 		print()
 
@@ -152,23 +131,18 @@ class Graph:
 			raise Exception("vertex %d doesn't exist" %vid)
 
 	def weight_on_edge(self, src, dst):
-		p = self.__adjlist[src].get_listpointer()
-		while p:
-			if p.get_dst_id() == dst:
-				return p.get_edge_weight()
-			p = p.get_next()
-		return -1
+		e = self.__edges.find_edge(src, dst)
+		if e < 0:
+			return -1
+		return (self.__edges.value(e, 0), self.__edges.value(e, 1))
 
 	def get_name_by_id(self, id):
-		return self.__adjlist[id].get_name()
+		return self.__names.name(id)
 
 	def init_dominance(self):
 		for vobj in self.__adjlist:
-			p = vobj.get_listpointer()
-			while p:
-				duration = p.get_edge_weight()[1]
+			for duration in self.__edges.out_values(vobj.get_id(), 1):
 				vobj.acc_dominance(duration)
-				p = p.get_next()
 		self.__white_count = len(self.__adjlist)
 
 	def update_dominances(self):
@@ -178,25 +152,21 @@ class Graph:
 			self.update_dominance(vobj)
 
 	def update_dominance(self, vobj):
-		p = vobj.get_listpointer()
-		while p:
+		for p, weight in self.neighbors(vobj.get_id()):
 			# vobj 邻接了 p 这个黑节点，此边的支配作用消失
-			if self.__adjlist[p.get_dst_id()].get_color() == COLOR_BLACK:
-				vobj.dec_dominance(p.get_edge_weight()[1])
-				p = p.get_next()
+			if self.__adjlist[p].get_color() == COLOR_BLACK:
+				vobj.dec_dominance(weight[1])
 				continue
 			# 判断 p 这个邻接点是否与黑节点相邻，如果相邻则返回被黑掉的区间
-			(vobj_adj_adjoin_black, blacked_weight) = self.is_adj_with_black(p.get_dst_id())
+			(vobj_adj_adjoin_black, blacked_weight) = self.is_adj_with_black(p)
 			# p 与黑节点不相邻，vobj <-> p 的边不受影响，继续遍历下一个邻接点
 			if not vobj_adj_adjoin_black:
-				p = p.get_next()
 				continue
 			# vobj 不能完全支配其邻接点 p，减去被黑掉的区间长度
-			delta = self.intersect(blacked_weight, p.get_edge_weight())
+			delta = self.intersect(blacked_weight, weight)
 			# 如果交集为空，则 vobj 的支配值不受影响；若非空，则 vobj 的支配值要减掉被黑的部分
 			if delta is not None:
 				vobj.dec_dominance(delta[1])
-			p = p.get_next()
 
 		if self.__debug:
 			print("========= Dump dominance for debugging =========")
@@ -204,14 +174,12 @@ class Graph:
 
 	# 如果 vid 不邻接黑节点，则返回 False，否则算出邻接黑节点的边的并集
 	def is_adj_with_black(self, vid):
-		p = self.__adjlist[vid].get_listpointer()
 		ret = False
 		union_weight = None
-		while p:
-			if self.__adjlist[p.get_dst_id()].get_color() == COLOR_BLACK:
+		for p, weight in self.neighbors(vid):
+			if self.__adjlist[p].get_color() == COLOR_BLACK:
 				ret = True
-				union_weight = self.union(union_weight, p.get_edge_weight())
-			p = p.get_next()
+				union_weight = self.union(union_weight, weight)
 		return (ret, union_weight)
 
 	def union(self, weight1, weight2):
@@ -269,20 +237,16 @@ class Graph:
 				self.__white_count -= 1
 			self.__adjlist[max_dominance_vid].set_color(COLOR_BLACK)
 			# set grey vertex
-			p = self.__adjlist[max_dominance_vid].get_listpointer()
-			while p:
-				if self.__adjlist[p.get_dst_id()].get_color() != COLOR_WHITE:
-					p = p.get_next()
+			for p, weight in self.neighbors(max_dominance_vid):
+				if self.__adjlist[p].get_color() != COLOR_WHITE:
 					continue
-				weight = p.get_edge_weight()
 				start = weight[0]
 				end = weight[0] + weight[1]
-				self.__adjlist[p.get_dst_id()].dominate_timeline(start, end)
-				if self.__adjlist[p.get_dst_id()].timeline_is_dominated():
-					self.__adjlist[p.get_dst_id()].set_color(COLOR_GREY)
-					self.__color_process.append(self.get_name_by_id(p.get_dst_id()))
+				self.__adjlist[p].dominate_timeline(start, end)
+				if self.__adjlist[p].timeline_is_dominated():
+					self.__adjlist[p].set_color(COLOR_GREY)
+					self.__color_process.append(self.get_name_by_id(p))
 					self.__white_count -= 1
-				p = p.get_next()
 
 			if self.__white_count == 0:
 				break
@@ -300,13 +264,11 @@ class Graph:
 	def draw(self):
 		g = nx.Graph()
 		for vobj in self.__adjlist:
-			p = vobj.get_listpointer()
-			while p:
-				g.add_edge(vobj.get_name(), self.get_name_by_id(p.get_dst_id()))
-				p = p.get_next()
+			for dst in self.__edges.out_neighbors(vobj.get_id()):
+				g.add_edge(vobj.get_name(), self.get_name_by_id(dst))
 		color_vals = []
 		for node in g.nodes():
-			vid = self.__vertex_names.index(node)
+			vid = self.__names.id(node)
 			if self.__adjlist[vid].get_color() == COLOR_BLACK:
 				color_vals.append("#000000")
 			elif self.__adjlist[vid].get_color() == COLOR_GREY:
@@ -329,11 +291,9 @@ if __name__ == '__main__':
 					continue
 				vertex_names.add(line.split()[0])
 				vertex_names.add(line.split()[1])
-	# 需要转为list，程序要用到list的特性，使用节点名称反查节点下标，参见add_edge函数
-	vertex_names = list(vertex_names)
 	# 排个序，当两个节点的支配值相等时，节点在__adjlist中的顺序直接影响谁会被选中，所以如果不排序
 	# 则每次运行程序的结果都不一样
-	vertex_names = sorted(list(vertex_names))
+	vertex_names = sorted(vertex_names)
 	graph.add_vertices(vertex_names)
 
 	preprocess = dict()
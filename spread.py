@@ -0,0 +1,129 @@
+''' Monte-Carlo estimate of the independent cascade (IC) spread of a seed set.
+
+The graph is packed once into a CSRGraph with one probability column, so
+every cascade reads neighbours and Ep as array slices. Cascades run in
+batches, each batch with its own random.Random seeded from (seed, batch
+number). Batch results are taken in batch order and the stopping rule is
+checked after each one, so the runs and the estimate depend only on the
+seed, I and rel_tol, never on how many workers share them.
+Workers are forked after the graph is built and inherit it; only seed ids
+and batch numbers are sent per task. Each estimator registers its graph in
+_shared under its own key, so several estimators can be open at once.
+'''
+
+from __future__ import division
+import math, random, itertools, multiprocessing
+from collections import deque
+from csrgraph import CSRGraph
+from nameindex import NameIndex
+
+# estimator key to CSR graph, for the pool workers; set before the pool forks
+_shared = dict()
+_keys = itertools.count()
+
+def buildCSR(G, Ep):
+    ''' Pack networkx graph G and edge probabilities Ep into a CSRGraph.
+    Returns the graph and the NameIndex of node labels to CSR ids.
+    '''
+    index = NameIndex(G)
+    graph = CSRGraph('d')
+    graph.add_vertices(len(index))
+    for u, v in G.edges():
+        graph.add_edge(index.id(u), index.id(v), Ep[(u, v)])
+    return graph, index
+
+def runIC(graph, seeds, rnd):
+    ''' Run one IC cascade from seeds and return the number of active nodes. '''
+    active = set(seeds)
+    frontier = list(active)
+    coin = rnd.random
+    while frontier:
+        newly_active = []
+        for u in frontier:
+            for v, p in zip(graph.out_neighbors(u), graph.out_values(u)):
+                if v not in active and coin() < p:
+                    active.add(v)
+                    newly_active.append(v)
+        frontier = newly_active
+    return len(active)
+
+def _runBatch(task):
+    ''' Run one batch of cascades; returns (runs, sum, sum of squares). '''
+    key, seeds, runs, seed, batch = task
+    graph = _shared[key]
+    rnd = random.Random("%s-%s" %(seed, batch))
+    total = total_sq = 0
+    for _ in range(runs):
+        size = runIC(graph, seeds, rnd)
+        total += size
+        total_sq += size*size
+    return runs, total, total_sq
+
+class SpreadEstimator(object):
+    ''' Estimate the IC spread of seed sets on G with probabilities Ep.
+
+    processes=1 runs the cascades in this process; any other value keeps a
+    multiprocessing pool (None uses every core) alive until close().
+    '''
+    def __init__(self, G, Ep, processes=1, batch_size=50):
+        self.graph, self.index = buildCSR(G, Ep)
+        self.batch_size = batch_size
+        self.processes = processes or multiprocessing.cpu_count()
+        self.pool = None
+        self.key = next(_keys)
+        _shared[self.key] = self.graph
+        if processes != 1:
+            self.pool = multiprocessing.Pool(processes)
+
+    def estimate(self, S, I=1000, seed=0, rel_tol=None, z=1.96):
+        ''' Run up to I cascades from S and return a dict with the mean spread,
+        its sample variance, the z-score confidence interval of the mean and
+        the number of runs. With rel_tol set, stop as soon as the interval's
+        half-width is within rel_tol of the mean.
+        '''
+        if I <= 0:
+            raise Exception("need at least one cascade, got I=%r" % I)
+        seeds = [self.index.id(u) for u in S]
+        tasks = [(self.key, seeds, min(self.batch_size, I - start), seed, batch)
+                 for batch, start in enumerate(range(0, I, self.batch_size))]
+        runs = total = total_sq = 0
+        for r, t, t_sq in self._results(tasks):
+            runs += r
+            total += t
+            total_sq += t_sq
+            stats = self._stats(runs, total, total_sq, z)
+            if rel_tol is not None and runs > 1 and stats["ci"][1] - stats["mean"] <= rel_tol*stats["mean"]:
+                break
+        return stats
+
+    def _results(self, tasks):
+        ''' Yield the results of tasks in order. With a pool, at most one batch
+        per worker is in flight, so stopping early leaves little work behind.
+        '''
+        if self.pool is None:
+            for task in tasks:
+                yield _runBatch(task)
+            return
+        pending = deque()
+        for task in tasks:
+            if len(pending) == self.processes:
+                yield pending.popleft().get()
+            pending.append(self.pool.apply_async(_runBatch, (task,)))
+        while pending:
+            yield pending.popleft().get()
+
+    @staticmethod
+    def _stats(runs, total, total_sq, z):
+        mean = total/runs
+        variance = (total_sq - runs*mean*mean)/(runs - 1) if runs > 1 else 0.0
+        variance = max(variance, 0.0)
+        half_width = z*math.sqrt(variance/runs)
+        return {"mean": mean, "variance": variance,
+                "ci": (mean - half_width, mean + half_width), "runs": runs}
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        _shared.pop(self.key, None)